@@ -1,31 +1,52 @@
-from flask import Flask, render_template, request, redirect, url_for, flash
+from flask import Flask, Response, render_template, request, redirect, url_for, flash, jsonify, session, stream_with_context
+from markupsafe import Markup
+import assets
+import database
+import holds
+import instrumentation
+import jobs
+import replica
 from database import get_connection
-import random
-import string
+from replica import get_read_connection
+from reservations import SeatsUnavailable, reserve_seats
+from seat_cache import seat_maps
+from seat_events import seat_feed
+from page_cache import cached_page, fragments
+import rollups
+from timeformat import day_bounds, display_showtime, parse_day, to_storage
+from datetime import datetime
+import csv
+import io
+import json
+import os
+import secrets
 
 app = Flask(__name__)
 app.secret_key = "super-secret-key-change-me"  # needed for flash messages
+database.init_app(app)  # pooled connections, released after each request
+replica.init_app(app)  # read-only snapshot for catalog and report pages
+assets.init_app(app)  # fingerprinted files from build_assets.py, served from /assets
+instrumentation.init_app(app)  # only when MOVIE_BOOKING_METRICS is set
+app.add_template_filter(display_showtime, "showtime")
+seat_feed.add_listener(seat_maps.apply_changes)
 
-images = {
-    1:"avatar.jpg",
-    2:"twilight.jpg",
-    3:"wicked.jpg",
-    4: "jurassic.jpg",
-    5:"black-panther.jpg"
-    }
+UPCOMING_SHOWTIMES_LIMIT = 20
 
-def generate_confirmation_code(length=8):
-    return "".join(random.choices(string.ascii_uppercase + string.digits, k=length))
+def hold_owner(create=False):
+    """The id seat holds are placed under: one per browser session."""
+    if create and "holder" not in session:
+        session["holder"] = secrets.token_urlsafe(12)
+    return session.get("holder")
 
 @app.route("/")
+@cached_page
 def home():
     """Main screen: show all movies and let the user pick one."""
-    conn = get_connection()
+    conn = get_read_connection()
     cur = conn.cursor()
 
     cur.execute("SELECT * FROM movies ORDER BY title;")
     movies = cur.fetchall()
-    conn.close()
 
     if not movies:
         return "No movies found. Did you run init_db.py?", 500
@@ -35,8 +56,9 @@ def home():
 
 
 @app.route("/movie/<int:movie_id>")
+@cached_page
 def movie_detail(movie_id):
-    conn = get_connection()
+    conn = get_read_connection()
     cur = conn.cursor()
 
     cur.execute("SELECT * FROM movies WHERE id = ?;", (movie_id,))
@@ -48,17 +70,55 @@ def movie_detail(movie_id):
     )
     showtimes = cur.fetchall()
 
-    conn.close()
-
     if movie is None:
         return "Movie not found", 404
 
-    return render_template("movie.html", movie=movie, showtimes=showtimes, image=images[movie_id])
+    return render_template("movie.html", movie=movie, showtimes=showtimes)
 
 
 
-@app.route("/showtime/<int:showtime_id>/seats", methods=["GET", "POST"])
-def showtime_seats(showtime_id):
+@app.route("/showtimes")
+def showtimes_list():
+    """Showtimes on one day (?date=YYYY-MM-DD), or the next upcoming ones."""
+    date_arg = request.args.get("date")
+    day = parse_day(date_arg)
+    if date_arg and day is None:
+        return "Invalid date, expected YYYY-MM-DD", 400
+
+    conn = get_connection()
+    cur = conn.cursor()
+
+    # both are range scans on idx_showtimes_start
+    if day is not None:
+        cur.execute(
+            """
+            SELECT st.*, m.title
+            FROM showtimes st
+            JOIN movies m ON st.movie_id = m.id
+            WHERE st.start_time >= ? AND st.start_time < ?
+            ORDER BY st.start_time;
+            """,
+            day_bounds(day),
+        )
+    else:
+        cur.execute(
+            """
+            SELECT st.*, m.title
+            FROM showtimes st
+            JOIN movies m ON st.movie_id = m.id
+            WHERE st.start_time >= ?
+            ORDER BY st.start_time
+            LIMIT ?;
+            """,
+            (to_storage(datetime.now()), UPCOMING_SHOWTIMES_LIMIT),
+        )
+    showtimes = cur.fetchall()
+
+    return render_template("showtimes.html", showtimes=showtimes, day=day)
+
+
+def load_seat_map(showtime_id):
+    """Everything seats.html needs for one showtime, straight from SQLite."""
     conn = get_connection()
     cur = conn.cursor()
 
@@ -67,12 +127,33 @@ def showtime_seats(showtime_id):
     showtime = cur.fetchone()
 
     if showtime is None:
-        conn.close()
-        return "Showtime not found", 404
+        return None
 
     cur.execute("SELECT * FROM movies WHERE id = ?;", (showtime["movie_id"],))
     movie = cur.fetchone()
 
+    cur.execute(
+        """
+        SELECT * FROM seats
+        WHERE showtime_id = ?
+        ORDER BY row_label, seat_number;
+        """,
+        (showtime_id,),
+    )
+    seats = cur.fetchall()
+
+    return showtime, movie, seats, holds.active_holds(conn, showtime_id)
+
+
+@app.route("/showtime/<int:showtime_id>/seats", methods=["GET", "POST"])
+def showtime_seats(showtime_id):
+    seat_feed.start()  # keeps seat_maps up to date with other processes
+    seat_map = seat_maps.get(showtime_id, load_seat_map)
+
+    if seat_map is None:
+        return "Showtime not found", 404
+
+    lost_seat_ids = set()
     if request.method == "POST":
         selected_seat_ids = request.form.getlist("seats")
         customer_name = request.form.get("customer_name", "").strip() or "Guest"
@@ -80,62 +161,108 @@ def showtime_seats(showtime_id):
         if not selected_seat_ids:
             flash("Please select at least one seat.", "error")
         else:
-            # Check that seats are still available
-            placeholders = ",".join("?" for _ in selected_seat_ids)
-            query = f"""
-                SELECT id, is_booked
-                FROM seats
-                WHERE id IN ({placeholders}) AND showtime_id = ?;
-            """
-            cur.execute(query, (*selected_seat_ids, showtime_id))
-            seats = cur.fetchall()
-
-            # verify none already booked
-            already_booked = [s for s in seats if s["is_booked"] == 1]
-
-            if already_booked:
-                flash("One or more selected seats were just booked. Please try again.", "error")
+            try:
+                confirmation, booked = reserve_seats(
+                    get_connection(), showtime_id, selected_seat_ids, customer_name, holder=hold_owner()
+                )
+            except SeatsUnavailable as exc:
+                lost_seat_ids = exc.seat_ids
+                # our copy of the map may be what sent the user after taken seats
+                seat_maps.invalidate(showtime_id)
+                seat_map = seat_maps.get(showtime_id, load_seat_map)
             else:
-                confirmation = generate_confirmation_code()
-
-                for seat in seats:
-                    # mark seat as booked
-                    cur.execute(
-                        "UPDATE seats SET is_booked = 1 WHERE id = ?;",
-                        (seat["id"],),
-                    )
-                    # insert booking
-                    cur.execute(
-                        """
-                        INSERT INTO bookings (showtime_id, seat_id, customer_name, confirmation_code)
-                        VALUES (?, ?, ?, ?);
-                        """,
-                        (showtime_id, seat["id"], customer_name, confirmation),
-                    )
-
-                conn.commit()
-                conn.close()
+                seat_maps.mark_booked(showtime_id, booked)
                 return redirect(url_for("booking_success", confirmation_code=confirmation))
 
-    # GET or failed POST → show seats
-    cur.execute(
-        """
-        SELECT * FROM seats
-        WHERE showtime_id = ?
-        ORDER BY row_label, seat_number;
-        """,
-        (showtime_id,),
+    # GET or failed POST → show seats, grouped by row
+    if lost_seat_ids:
+        taken = [
+            f"{row_label}{seat.seat_number}"
+            for row_label, seats in seat_map.rows().items()
+            for seat in seats
+            if seat.id in lost_seat_ids
+        ]
+        if taken:
+            flash(f"Seats {', '.join(taken)} were just taken by someone else. Please try again.", "error")
+        else:
+            flash("One or more selected seats are not available. Please try again.", "error")
+
+    owner = hold_owner()
+    held, mine = set(), set()
+    for seat_id, holder in seat_map.live_holds().items():
+        (mine if holder == owner else held).add(seat_id)
+    held, mine = frozenset(held), frozenset(mine)
+
+    # the header only changes with the layout, the grid with the booked bits and holds
+    seat_header = fragments.get_or_render(
+        ("seat_header", seat_map.layout),
+        lambda: render_template("_seat_header.html", movie=seat_map.movie, showtime=seat_map.showtime),
+    )
+    seat_grid = fragments.get_or_render(
+        ("seat_grid", showtime_id, seat_map.bits, held, mine),
+        lambda: render_template("_seat_grid.html", rows=seat_map.rows(), held=held, mine=mine),
+    )
+    return render_template(
+        "seats.html",
+        showtime_id=showtime_id,
+        hold_ttl=int(holds.HOLD_TTL),
+        seat_header=Markup(seat_header),
+        seat_grid=Markup(seat_grid),
     )
-    seats = cur.fetchall()
-    conn.close()
 
-    # group seats by row for display
-    rows = {}
-    for seat in seats:
-        row_label = seat["row_label"]
-        rows.setdefault(row_label, []).append(seat)
 
-    return render_template("seats.html", movie=movie, showtime=showtime, rows=rows)
+@app.route("/showtime/<int:showtime_id>/events")
+def seat_events(showtime_id):
+    """Server-Sent Events feed of seat changes for seats.html (see seat_events.py)."""
+    conn = get_connection()
+    if conn.execute("SELECT 1 FROM showtimes WHERE id = ?;", (showtime_id,)).fetchone() is None:
+        return "Showtime not found", 404
+
+    if not seat_feed.open_stream():
+        return "Too many live viewers right now, please try again shortly", 503, {"Retry-After": "5"}
+
+    # a plain generator, not stream_with_context: the pooled connection goes
+    # back as soon as this returns instead of staying checked out per viewer
+    stream = seat_feed.stream(showtime_id, request.headers.get("Last-Event-ID", type=int))
+    response = Response(stream, mimetype="text/event-stream")
+    response.call_on_close(seat_feed.close_stream)
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"  # don't let a proxy sit on the events
+    return response
+
+
+@app.route("/showtime/<int:showtime_id>/holds", methods=["POST"])
+def seat_holds(showtime_id):
+    """Place, extend or release this session's seat holds (JSON API for seats.html).
+
+    Form fields: action=place|extend|release, seats=<seat id> (repeatable;
+    release without seats drops all of them). A place that can't get every
+    seat gets none and answers 409 with the unavailable ids, or 429 if it
+    would take the session past holds.MAX_HELD_SEATS_PER_HOLDER.
+    """
+    action = request.form.get("action", "place")
+    seat_ids = request.form.getlist("seats")
+    conn = get_connection()
+
+    if action == "place":
+        try:
+            held, expires_at = holds.place_holds(conn, showtime_id, seat_ids, hold_owner(create=True))
+        except SeatsUnavailable as exc:
+            return jsonify(unavailable=sorted(map(str, exc.seat_ids))), 409
+        except holds.HoldLimitExceeded as exc:
+            return jsonify(error=str(exc), limit=exc.limit), 429
+        # the earliest expiry stands in for all of them; a reload corrects it
+        seat_maps.mark_held(showtime_id, held, hold_owner(), expires_at)
+        return jsonify(held=held, expires_at=expires_at)
+    if action == "extend":
+        held, expires_at = holds.extend_holds(conn, showtime_id, hold_owner())
+        seat_maps.mark_held(showtime_id, held, hold_owner(), expires_at)
+        return jsonify(held=held, expires_at=expires_at)
+    if action == "release":
+        released = holds.release_holds(conn, showtime_id, hold_owner(), seat_ids or None)
+        seat_maps.mark_released(showtime_id, released)
+        return jsonify(released=released)
+    return "action must be one of: place, extend, release", 400
 
 
 @app.route("/booking/<string:confirmation_code>")
@@ -143,25 +270,27 @@ def booking_success(confirmation_code):
     conn = get_connection()
     cur = conn.cursor()
 
+    # one probe of the unique index on orders.code; every join after it is by key
     cur.execute(
         """
-        SELECT b.confirmation_code,
-               b.customer_name,
+        SELECT o.code AS confirmation_code,
+               o.customer_name,
                s.row_label,
                s.seat_number,
                st.start_time,
                st.screen_name,
                m.title
-        FROM bookings b
-        JOIN seats s ON b.seat_id = s.id
-        JOIN showtimes st ON b.showtime_id = st.id
-        JOIN movies m ON st.movie_id = m.id
-        WHERE b.confirmation_code = ?;
+        FROM orders o
+        JOIN showtimes st ON st.id = o.showtime_id
+        JOIN movies m ON m.id = st.movie_id
+        JOIN bookings b ON b.order_id = o.id
+        JOIN seats s ON s.id = b.seat_id
+        WHERE o.code = ?
+        ORDER BY s.row_label, s.seat_number;
         """,
         (confirmation_code,),
     )
     bookings = cur.fetchall()
-    conn.close()
 
     if not bookings:
         return "Booking not found", 404
@@ -178,26 +307,30 @@ def booking_success(confirmation_code):
 
 @app.route("/analytics")
 def analytics():
-    """Simple analysis: show how many seats are booked vs available per showtime."""
-    conn = get_connection()
+    """Simple analysis: show how many seats are booked vs available per showtime.
+
+    Reads the showtime_occupancy counters, so the cost is one row per
+    showtime no matter how many seats exist. Served from the read-only
+    snapshot, so it can lag bookings by up to the replica refresh interval.
+    """
+    conn = get_read_connection()
     cur = conn.cursor()
 
     cur.execute(
         """
+        -- full-scan-ok: the report covers every showtime
         SELECT st.id,
                st.start_time,
                m.title,
-               COUNT(s.id) AS total_seats,
-               SUM(CASE WHEN s.is_booked = 1 THEN 1 ELSE 0 END) AS booked_seats
+               o.total_seats,
+               o.booked_seats
         FROM showtimes st
         JOIN movies m ON st.movie_id = m.id
-        JOIN seats s ON s.showtime_id = st.id
-        GROUP BY st.id, st.start_time, m.title
+        JOIN showtime_occupancy o ON o.showtime_id = st.id
         ORDER BY st.start_time;
         """
     )
     rows = cur.fetchall()
-    conn.close()
 
     # Prepare data for chart/summary
     analytics_data = []
@@ -222,5 +355,71 @@ def analytics():
     return render_template("analytics.html", analytics_data=analytics_data)
 
 
+ROLLUP_COLUMNS = ["bucket_start", "movie_id", "title", "screen_name", "seats", "orders"]
+
+
+def _stream_json(rows):
+    yield "["
+    for i, row in enumerate(rows):
+        yield ("," if i else "") + json.dumps(dict(zip(ROLLUP_COLUMNS, row)))
+    yield "]\n"
+
+
+def _stream_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(ROLLUP_COLUMNS)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() > 8192:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+@app.route("/api/analytics")
+def api_analytics():
+    """Booking rollups as JSON or CSV.
+
+    Query args: bucket=hour|day (default day), from/to=YYYY-MM-DD (both
+    inclusive), movie_id, screen, format=json|csv (default json).
+    Data comes from booking_rollups, which the background job in rollups.py
+    keeps up to date, never from the bookings table.
+    """
+    bucket = request.args.get("bucket", "day")
+    if bucket not in rollups.BUCKETS:
+        return "bucket must be one of: " + ", ".join(rollups.BUCKETS), 400
+
+    fmt = request.args.get("format", "json")
+    if fmt not in ("json", "csv"):
+        return "format must be json or csv", 400
+
+    bounds = []
+    for arg in ("from", "to"):
+        value = request.args.get(arg)
+        day = parse_day(value)
+        if value and day is None:
+            return f"Invalid {arg} date, expected YYYY-MM-DD", 400
+        bounds.append(day)
+    start = day_bounds(bounds[0])[0] if bounds[0] else None
+    end = day_bounds(bounds[1])[1] if bounds[1] else None
+
+    movie_id = request.args.get("movie_id", type=int)
+    if "movie_id" in request.args and movie_id is None:
+        return "movie_id must be an integer", 400
+    screen_name = request.args.get("screen")
+
+    rows = rollups.query_rollups(get_connection(), bucket, start, end, movie_id, screen_name)
+    if fmt == "csv":
+        return Response(stream_with_context(_stream_csv(rows)), mimetype="text/csv")
+    return Response(stream_with_context(_stream_json(rows)), mimetype="application/json")
+
+
 if __name__ == "__main__":
+    # development server; `gunicorn app:app` (gunicorn.conf.py) runs it in production
+    # the reloader runs this file twice, a watcher and the server it restarts;
+    # only the server (WERKZEUG_RUN_MAIN) runs the jobs, or each would run twice
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        jobs.start_all()
     app.run(debug=True)
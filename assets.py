@@ -0,0 +1,108 @@
+"""Serve the fingerprinted assets built by build_assets.py.
+
+Templates never spell out asset paths: `asset_url("style.css")` looks the
+file up in static/dist/manifest.json and links to its content-hashed copy
+under /assets, and `poster_srcset(movie["poster"])` lists the WebP
+variants. Those URLs change whenever the content does, so /assets answers
+with a year-long immutable Cache-Control, and hands out the precompressed
+.br/.gz body when the client accepts it.
+
+Without a build (no manifest) everything falls back to plain /static URLs.
+So does any file edited since the last build, and every file in debug
+mode, so a stale static/dist never hides a change.
+"""
+import json
+import mimetypes
+import os
+import sys
+
+from flask import current_app, request, send_from_directory, url_for
+
+from build_assets import DIST_DIR, MANIFEST, STATIC_DIR, content_hash
+
+CACHE_FOREVER = 365 * 24 * 3600
+
+# best first
+ENCODING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+
+def _source_hash(name):
+    try:
+        with open(os.path.join(STATIC_DIR, name), "rb") as f:
+            return content_hash(f.read())
+    except FileNotFoundError:
+        return None
+
+
+def load_manifest(path=MANIFEST):
+    """The build's manifest, minus entries whose source changed since the build."""
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return {}
+
+    stale = sorted(name for name, entry in manifest.items() if entry.get("hash") != _source_hash(name))
+    if stale:
+        print(
+            f"static/dist is out of date for {', '.join(stale)}; serving /static copies "
+            "until build_assets.py is run again",
+            file=sys.stderr,
+        )
+    return {name: entry for name, entry in manifest.items() if name not in stale}
+
+
+def _manifest():
+    if current_app.debug:
+        return {}  # files get edited while the dev server runs
+    return current_app.extensions["asset_manifest"]
+
+
+def asset_url(name):
+    """URL for a file under static/, fingerprinted if it has been built."""
+    entry = _manifest().get(name)
+    if entry is None:
+        return url_for("static", filename=name)
+    return url_for("assets", filename=entry["path"])
+
+
+def poster_srcset(poster):
+    """srcset of a poster's WebP variants, or "" if there are none."""
+    entry = _manifest().get("images/" + poster) if poster else None
+    if entry is None:
+        return ""
+    return ", ".join(f"{url_for('assets', filename=v['path'])} {v['width']}w" for v in entry["variants"])
+
+
+def serve_asset(filename):
+    encodings = current_app.extensions["asset_encodings"].get(filename, ())
+    for encoding in encodings:
+        if request.accept_encodings[encoding]:
+            response = send_from_directory(
+                DIST_DIR,
+                filename + ENCODING_SUFFIXES[encoding],
+                mimetype=mimetypes.guess_type(filename)[0],
+                max_age=CACHE_FOREVER,
+            )
+            response.content_encoding = encoding
+            break
+    else:
+        response = send_from_directory(DIST_DIR, filename, max_age=CACHE_FOREVER)
+
+    if encodings:
+        response.vary.add("Accept-Encoding")
+    response.cache_control.immutable = True
+    return response
+
+
+def init_app(app):
+    manifest = load_manifest()
+    app.extensions["asset_manifest"] = manifest
+    # fingerprinted file -> the precompressed encodings that exist for it
+    app.extensions["asset_encodings"] = {
+        entry["path"]: [e for e in ENCODING_SUFFIXES if e in entry.get("encodings", ())]
+        for entry in manifest.values()
+    }
+    app.add_url_rule("/assets/<path:filename>", "assets", serve_asset)
+    app.add_template_global(asset_url)
+    app.add_template_global(poster_srcset)
@@ -0,0 +1,314 @@
+"""Benchmarks for the movie booking app.
+
+Runs against a throwaway database so movie_booking.db is never touched:
+
+    python benchmark.py                # all benchmarks
+    python benchmark.py connections    # just one
+    python benchmark.py lookups --bookings 10000000
+
+These measure individual components. For request throughput and latency
+across every route, see loadtest.py.
+"""
+import argparse
+import math
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+
+_tmpdir = tempfile.mkdtemp(prefix="movie-bench-")
+os.environ.setdefault("MOVIE_BOOKING_DB", os.path.join(_tmpdir, "bench.db"))
+
+import database  # noqa: E402  (must come after MOVIE_BOOKING_DB is set)
+import holds  # noqa: E402
+import init_db  # noqa: E402
+import occupancy  # noqa: E402
+import timeformat  # noqa: E402
+from app import app  # noqa: E402
+from reservations import SeatsUnavailable, find_inconsistencies, reserve_seats  # noqa: E402
+from seat_cache import seat_maps  # noqa: E402
+
+
+def fresh_database():
+    init_db.create_tables(reset=True)
+    init_db.seed_data()
+
+
+def report(name, count, elapsed):
+    print(f"{name:<40} {count:>7} ops  {elapsed:7.3f}s  {count / elapsed:10.1f} ops/sec")
+
+
+def bench_connections(iterations=5000):
+    """Per-request sqlite3.connect (the old get_connection) vs the pool."""
+    query = "SELECT * FROM showtimes WHERE movie_id = ? ORDER BY start_time;"
+
+    start = time.perf_counter()
+    for i in range(iterations):
+        conn = sqlite3.connect(database.DB_NAME)
+        conn.row_factory = sqlite3.Row
+        conn.execute(query, (i % 5 + 1,)).fetchall()
+        conn.close()
+    report("connect per request", iterations, time.perf_counter() - start)
+
+    pool = database.ConnectionPool()
+    start = time.perf_counter()
+    for i in range(iterations):
+        conn = pool.acquire()
+        conn.execute(query, (i % 5 + 1,)).fetchall()
+        pool.release(conn)
+    report("pooled connection", iterations, time.perf_counter() - start)
+    pool.close_all()
+
+
+def run_clients(paths, threads, requests_per_thread):
+    """Hit `paths` round-robin from several threads with the test client."""
+    errors = []
+
+    def worker():
+        client = app.test_client()
+        for i in range(requests_per_thread):
+            response = client.get(paths[i % len(paths)])
+            if response.status_code != 200:
+                errors.append(response.status_code)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return time.perf_counter() - start, errors
+
+
+def bench_seat_map(threads=8, requests_per_thread=250):
+    """The seat page with the seat map cache on, and with every GET a miss."""
+    paths = [f"/showtime/{i}/seats" for i in range(1, 16)]
+
+    max_age = seat_maps.max_age
+    seat_maps.max_age = 0
+    elapsed, _ = run_clients(paths, threads, requests_per_thread)
+    report("seat page, uncached", threads * requests_per_thread, elapsed)
+
+    seat_maps.max_age = max_age
+    seat_maps.clear()
+    before = seat_maps.stats()
+    elapsed, _ = run_clients(paths, threads, requests_per_thread)
+    report("seat page, cached", threads * requests_per_thread, elapsed)
+    after = seat_maps.stats()
+    print(f"  hits: {after['hits'] - before['hits']}  misses: {after['misses'] - before['misses']}")
+
+
+def bench_contention(threads=32, attempts_per_thread=50, showtime_id=1):
+    """Many buyers racing for the same handful of seats on one showtime."""
+    conn = database.connect()
+    seat_ids = [r["id"] for r in conn.execute("SELECT id FROM seats WHERE showtime_id = ?;", (showtime_id,))]
+    conn.close()
+
+    won, lost = [], []
+
+    def buyer(seed):
+        rng = random.Random(seed)
+        conn = database.connect()
+        for _ in range(attempts_per_thread):
+            wanted = rng.sample(seat_ids, rng.randint(1, 4))
+            try:
+                won.extend(reserve_seats(conn, showtime_id, wanted, "Bench")[1])
+            except SeatsUnavailable as exc:
+                lost.append(len(exc.seat_ids))
+        conn.close()
+
+    workers = [threading.Thread(target=buyer, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+
+    report(f"reservation attempts, {threads} threads", threads * attempts_per_thread, elapsed)
+    conn = database.connect()
+    problems = find_inconsistencies(conn)
+    doubled, mismatched = problems["double_booked"], problems["mismatched"]
+    drifted = len(occupancy.find_drift(conn))
+    conn.close()
+    print(f"  seats won: {len(won)}/{len(seat_ids)}  failed attempts: {len(lost)}  "
+          f"double-booked seats: {doubled}  seat/booking mismatches: {mismatched}  "
+          f"occupancy drift: {drifted}")
+    if doubled or mismatched or drifted or len(won) != len(set(won)):
+        sys.exit("double-booking detected")
+
+
+def bench_holds(total=300_000, batch_sizes=(holds.SWEEP_BATCH, 10_000, None)):
+    """Sweeping expired holds out of a table of `total` holds.
+
+    Half the holds are expired. While each sweep runs, another thread keeps
+    placing and releasing holds, and its worst latency shows how long the
+    sweeper kept the write lock. batch_size None sweeps in one transaction.
+    """
+    # enough seats for every hold plus some free ones for the placer
+    init_db.create_tables(reset=True)
+    counts, _ = init_db.generate_data(movies=20, screens=10, days=32, shows_per_day=4)
+    conn = database.connect()
+    seat_rows = conn.execute("SELECT id, showtime_id FROM seats ORDER BY id;").fetchall()
+    held, free = seat_rows[:total], seat_rows[total:]
+    active = total - total // 2
+    print(f"  {counts['seats']} seats, {active} live + {total // 2} expired holds")
+
+    live = holds._expiry(3600)
+    expired = holds._now()  # sweep_expired(now=...) below runs a minute later
+    for batch_size in batch_sizes:
+        conn.execute("DELETE FROM seat_holds;")
+        start = time.perf_counter()
+        conn.executemany(
+            "INSERT INTO seat_holds (seat_id, showtime_id, holder, expires_at) VALUES (?, ?, 'bench', ?);",
+            ((seat_id, showtime_id, expired if i % 2 else live) for i, (seat_id, showtime_id) in enumerate(held)),
+        )
+        conn.commit()
+        report("insert holds", total, time.perf_counter() - start)
+
+        stop = threading.Event()
+        latencies = []
+
+        def placer():
+            rng = random.Random(1)
+            conn = database.connect()
+            while not stop.is_set():
+                seat_id, showtime_id = rng.choice(free)
+                started = time.perf_counter()
+                holds.place_holds(conn, showtime_id, [seat_id], "placer")
+                holds.release_holds(conn, showtime_id, "placer")
+                latencies.append(time.perf_counter() - started)
+            conn.close()
+
+        thread = threading.Thread(target=placer)
+        thread.start()
+        start = time.perf_counter()
+        swept = holds.sweep_expired(
+            conn, batch_size=batch_size or total, now=timeformat.utc_now() + timedelta(minutes=1)
+        )
+        elapsed = time.perf_counter() - start
+        stop.set()
+        thread.join()
+
+        label = f"sweep, batch {batch_size}" if batch_size else "sweep, one transaction"
+        report(label, swept, elapsed)
+        left = conn.execute("SELECT COUNT(*) FROM seat_holds;").fetchone()[0]
+        latencies.sort()
+        print(f"  holds left: {left}  concurrent place+release: {len(latencies)} ops, "
+              f"p50 {latencies[len(latencies) // 2] * 1000:.2f}ms  max {latencies[-1] * 1000:.2f}ms")
+        if swept != total // 2 or left != active:
+            sys.exit("sweeper removed the wrong holds")
+    conn.close()
+    fresh_database()
+
+
+def latency_summary(latencies):
+    latencies = sorted(latencies)
+    return (
+        f"p50 {latencies[len(latencies) // 2] * 1e6:.0f}us  "
+        f"p99 {latencies[int(len(latencies) * 0.99)] * 1e6:.0f}us  max {latencies[-1] * 1e6:.0f}us"
+    )
+
+
+def bench_lookups(bookings=1_000_000, lookups=20_000):
+    """Confirmation page lookups against about `bookings` generated bookings.
+
+    Compares the old query (bookings by confirmation_code, then the joins)
+    with the orders one booking_success runs now, on random codes, then
+    times the route end to end.
+    """
+    rows, seats_per_row, screens, shows_per_day, occupancy = 20, 25, 20, 4, 0.9
+    per_day = screens * shows_per_day * rows * seats_per_row * occupancy
+    init_db.create_tables(reset=True)
+    counts, elapsed = init_db.generate_data(
+        movies=200,
+        screens=screens,
+        days=max(1, math.ceil(bookings / per_day)),
+        shows_per_day=shows_per_day,
+        rows=rows,
+        seats_per_row=seats_per_row,
+        occupancy=occupancy,
+    )
+    print(f"  {counts['bookings']:,} bookings in {counts['orders']:,} orders, generated in {elapsed:.1f}s")
+
+    # generated codes are a function of the order id, so no need to read them back
+    rng = random.Random(1)
+    codes = [init_db.synthetic_code(rng.randint(1, counts["orders"])) for _ in range(lookups)]
+
+    queries = {
+        "lookup by bookings.confirmation_code": """
+            SELECT b.confirmation_code, b.customer_name, s.row_label, s.seat_number,
+                   st.start_time, st.screen_name, m.title
+            FROM bookings b
+            JOIN seats s ON b.seat_id = s.id
+            JOIN showtimes st ON b.showtime_id = st.id
+            JOIN movies m ON st.movie_id = m.id
+            WHERE b.confirmation_code = ?;
+            """,
+        "lookup by orders.code": """
+            SELECT o.code, o.customer_name, s.row_label, s.seat_number,
+                   st.start_time, st.screen_name, m.title
+            FROM orders o
+            JOIN showtimes st ON st.id = o.showtime_id
+            JOIN movies m ON m.id = st.movie_id
+            JOIN bookings b ON b.order_id = o.id
+            JOIN seats s ON s.id = b.seat_id
+            WHERE o.code = ?
+            ORDER BY s.row_label, s.seat_number;
+            """,
+    }
+    conn = database.connect()
+    # the index the old query used; migration 13 dropped it
+    conn.execute("CREATE INDEX idx_bookings_confirmation ON bookings (confirmation_code);")
+    for name, sql in queries.items():
+        latencies, found = [], 0
+        start = time.perf_counter()
+        for code in codes:
+            started = time.perf_counter()
+            found += bool(conn.execute(sql, (code,)).fetchall())
+            latencies.append(time.perf_counter() - started)
+        report(name, lookups, time.perf_counter() - start)
+        print(f"  found {found}/{lookups}  {latency_summary(latencies)}")
+    conn.close()
+
+    client = app.test_client()
+    latencies = []
+    start = time.perf_counter()
+    for code in codes[: lookups // 10]:
+        started = time.perf_counter()
+        if client.get(f"/booking/{code}").status_code != 200:
+            sys.exit(f"booking {code} not found")
+        latencies.append(time.perf_counter() - started)
+    report("GET /booking/<code>", len(latencies), time.perf_counter() - start)
+    print(f"  {latency_summary(latencies)}")
+    fresh_database()
+
+
+BENCHMARKS = {
+    "connections": bench_connections,
+    "seatmap": bench_seat_map,
+    "contention": bench_contention,
+    "holds": bench_holds,
+    "lookups": bench_lookups,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run component benchmarks.")
+    parser.add_argument("names", nargs="*", help=f"any of: {', '.join(BENCHMARKS)} (default: all)")
+    parser.add_argument("--bookings", type=int, default=1_000_000, help="dataset size for `lookups`")
+    args = parser.parse_args()
+    unknown = set(args.names) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmark: {', '.join(sorted(unknown))}")
+
+    fresh_database()
+    for name in args.names or list(BENCHMARKS):
+        if name == "lookups":
+            bench_lookups(bookings=args.bookings)
+        else:
+            BENCHMARKS[name]()
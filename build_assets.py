@@ -0,0 +1,132 @@
+"""Build fingerprinted, pre-compressed static assets.
+
+Reads static/style.css and static/images/*, writes the results to
+static/dist/ and records them in static/dist/manifest.json, which
+assets.py loads at startup:
+
+* every file is copied as name.<hash>.ext, so it can be cached forever;
+* style.css also gets .gz and, with the `brotli` package, .br siblings
+  that /assets serves to clients that accept them;
+* posters get resized WebP variants (POSTER_WIDTHS).
+
+Pillow and brotli come from requirements-build.txt. Without them the build
+still works as a fallback: pages keep the fingerprinted original posters
+and gzip only, and the build says so.
+
+    pip install -r requirements-build.txt
+    python build_assets.py
+"""
+import gzip
+import hashlib
+import io
+import json
+import os
+import shutil
+import sys
+
+try:
+    from PIL import Image
+except ImportError:  # in requirements-build.txt; without it, no WebP poster variants
+    Image = None
+
+try:
+    import brotli
+except ImportError:  # in requirements-build.txt; without it, gzip only
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+MANIFEST = os.path.join(DIST_DIR, "manifest.json")
+
+POSTER_WIDTHS = (320, 640)
+WEBP_QUALITY = 80
+COMPRESSED = (".css", ".js", ".svg")
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def fingerprinted_name(name, data, suffix=""):
+    """"images/avatar.jpg" -> "avatar.<hash><suffix>.jpg" (flat, in dist/)."""
+    stem, ext = os.path.splitext(os.path.basename(name))
+    return f"{stem}.{content_hash(data)}{suffix}{ext}"
+
+
+def write(name, data):
+    with open(os.path.join(DIST_DIR, name), "wb") as f:
+        f.write(data)
+
+
+def build_compressed(name, data):
+    """Fingerprinted copy plus precompressed siblings; returns its manifest entry."""
+    out = fingerprinted_name(name, data)
+    write(out, data)
+    encodings = []
+    if brotli is not None:
+        write(out + ".br", brotli.compress(data, quality=11))
+        encodings.append("br")
+    # mtime=0 keeps the output byte-for-byte reproducible
+    write(out + ".gz", gzip.compress(data, compresslevel=9, mtime=0))
+    encodings.append("gzip")
+    return {"path": out, "encodings": encodings}
+
+
+def build_image(name, data):
+    """Fingerprinted original plus WebP variants; returns its manifest entry."""
+    out = fingerprinted_name(name, data)
+    write(out, data)
+    entry = {"path": out, "variants": []}
+    if Image is None:
+        return entry
+
+    with Image.open(os.path.join(STATIC_DIR, name)) as image:
+        image = image.convert("RGB")
+        for width in POSTER_WIDTHS:
+            if width >= image.width and entry["variants"]:
+                break  # no upscaling past the first variant
+            height = round(image.height * min(width, image.width) / image.width)
+            resized = image.resize((min(width, image.width), height), Image.LANCZOS)
+            buffer = io.BytesIO()
+            resized.save(buffer, "WEBP", quality=WEBP_QUALITY, method=6)
+            variant = buffer.getvalue()
+            variant_name = fingerprinted_name(os.path.splitext(name)[0] + ".webp", variant, f".w{resized.width}")
+            write(variant_name, variant)
+            entry["variants"].append({"width": resized.width, "path": variant_name, "bytes": len(variant)})
+    return entry
+
+
+def build():
+    shutil.rmtree(DIST_DIR, ignore_errors=True)
+    os.makedirs(DIST_DIR)
+
+    manifest = {}
+    sources = ["style.css"] + sorted(
+        os.path.join("images", f) for f in os.listdir(os.path.join(STATIC_DIR, "images"))
+    )
+    for name in sources:
+        with open(os.path.join(STATIC_DIR, name), "rb") as f:
+            data = f.read()
+        key = name.replace(os.sep, "/")
+        if name.endswith(COMPRESSED):
+            manifest[key] = build_compressed(name, data)
+        else:
+            manifest[key] = build_image(name, data)
+        manifest[key]["bytes"] = len(data)
+        manifest[key]["hash"] = content_hash(data)  # lets assets.py spot a stale build
+
+    with open(MANIFEST, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+if __name__ == "__main__":
+    if Image is None:
+        print("Pillow not installed: skipping WebP poster variants.", file=sys.stderr)
+    if brotli is None:
+        print("brotli not installed: writing .gz only.", file=sys.stderr)
+    for name, entry in build().items():
+        sizes = [f"{v['width']}w {v['bytes']:,} B" for v in entry.get("variants", [])]
+        extra = ", ".join(sizes or entry.get("encodings", []))
+        print(f"{name:<28} {entry['bytes']:>9,} B -> {entry['path']}" + (f" ({extra})" if extra else ""))
+    print(f"Wrote {os.path.relpath(MANIFEST)}")
@@ -0,0 +1,100 @@
+"""Fail if any query a route runs falls back to a full table scan.
+
+Drives every route with the Flask test client against a throwaway database,
+records each SQL statement the app executes, then runs EXPLAIN QUERY PLAN on
+it. Any plan step that scans a table without an index is reported and the
+script exits non-zero. A query that reads a whole table on purpose can opt
+out with a `-- full-scan-ok` comment in its SQL:
+
+    python check_query_plans.py
+"""
+import os
+import re
+import sys
+import tempfile
+
+_tmpdir = tempfile.mkdtemp(prefix="movie-plans-")
+os.environ.setdefault("MOVIE_BOOKING_DB", os.path.join(_tmpdir, "plans.db"))
+
+import database  # noqa: E402  (must come after MOVIE_BOOKING_DB is set)
+import init_db  # noqa: E402
+from app import app  # noqa: E402
+
+# statements worth checking; PRAGMAs, BEGIN/COMMIT etc. are skipped
+QUERY_RE = re.compile(r"^\s*(--[^\n]*\n\s*)*(SELECT|UPDATE|DELETE|INSERT|WITH)\b", re.IGNORECASE)
+
+# "SCAN t" on its own is a full table scan; "SCAN t USING INDEX ..." walks
+# an index in order, which is what we want for ORDER BY over a whole table.
+BAD_STEP_RE = re.compile(r"^SCAN \S+$")
+SCAN_OK_MARKER = "-- full-scan-ok"
+
+
+def record_route_queries():
+    statements = []
+
+    def traced_connect():
+        conn = database.connect()
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    database.get_pool()  # run migrations before swapping the pool
+    database._pool = database.ConnectionPool(factory=traced_connect)
+
+    client = app.test_client()
+    client.get("/")
+    client.get("/movie/1")
+    client.get("/showtimes")
+    client.get("/showtimes?date=2025-12-10")
+    client.post("/showtime/1/holds", data={"seats": ["3"]})
+    client.post("/showtime/1/holds", data={"action": "extend"})
+    client.get("/showtime/1/seats")
+    client.post("/showtime/1/holds", data={"action": "release"})
+    response = client.post("/showtime/1/seats", data={"seats": ["1", "2"]})
+    client.post("/showtime/1/seats", data={"seats": ["2"]})  # lost race path
+    client.get(response.location)
+    client.get("/analytics")
+    client.get("/api/analytics?bucket=hour&from=2025-12-10&to=2025-12-14")
+
+    # keep the first occurrence of each statement, in execution order
+    seen = {}
+    for sql in statements:
+        if QUERY_RE.match(sql):
+            seen.setdefault(one_line(sql), sql)
+    return list(seen.values())
+
+
+def one_line(sql):
+    lines = [line for line in sql.splitlines() if not line.strip().startswith("--")]
+    return " ".join(" ".join(lines).split())
+
+
+def bad_plan_steps(conn, sql):
+    plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+    return [row["detail"] for row in plan if BAD_STEP_RE.match(row["detail"])]
+
+
+def main():
+    init_db.create_tables(reset=True)
+    init_db.seed_data()
+
+    queries = record_route_queries()
+    conn = database.connect()
+    failures = 0
+    for sql in queries:
+        if SCAN_OK_MARKER in sql:
+            print(f"[skip] {one_line(sql)[:100]}")
+            continue
+        bad = bad_plan_steps(conn, sql)
+        status = "FAIL" if bad else "ok"
+        print(f"[{status:>4}] {one_line(sql)[:100]}")
+        for detail in bad:
+            print(f"       {detail}")
+        failures += bool(bad)
+    conn.close()
+
+    print(f"{len(queries)} queries checked, {failures} with table scans")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
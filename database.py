@@ -1,9 +1,149 @@
+import os
+import queue
 import sqlite3
+import threading
 
-DB_NAME = "movie_booking.db"
+from flask import current_app, g, has_app_context
 
+import migrations
 
-def get_connection():
-    conn = sqlite3.connect(DB_NAME)
+DB_NAME = os.environ.get("MOVIE_BOOKING_DB", "movie_booking.db")
+
+# How many connections the app keeps open at most. Requests beyond this wait
+# for a connection to be released instead of opening new ones; gunicorn.conf.py
+# sets it to the number of request threads unless it is already set.
+POOL_SIZE = int(os.environ.get("MOVIE_BOOKING_POOL_SIZE", "8"))
+ACQUIRE_TIMEOUT = 10.0  # seconds a request waits for a connection before a 503
+
+# Applied to every new connection. WAL lets readers run alongside the booking
+# writer; busy_timeout makes writers wait for the lock instead of failing.
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL;",
+    "PRAGMA synchronous = NORMAL;",
+    "PRAGMA busy_timeout = 5000;",
+    "PRAGMA foreign_keys = ON;",
+    "PRAGMA cache_size = -16000;",  # negative = KiB, so ~16 MB
+    "PRAGMA mmap_size = 268435456;",  # 256 MB
+    "PRAGMA temp_store = MEMORY;",
+)
+
+
+def connect():
+    """Open a new, tuned connection (not pooled)."""
+    conn = sqlite3.connect(
+        DB_NAME,
+        timeout=5.0,
+        check_same_thread=False,  # pooled connections move between threads
+        cached_statements=256,
+    )
     conn.row_factory = sqlite3.Row  # lets us access columns by name
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
     return conn
+
+
+class PoolExhausted(Exception):
+    """No connection came free within the acquire timeout."""
+
+
+class ConnectionPool:
+    """A bounded pool of SQLite connections shared by all request threads."""
+
+    def __init__(self, size=None, factory=None):
+        self.size = size or POOL_SIZE
+        self.factory = factory or connect
+        self._idle = queue.LifoQueue(maxsize=self.size)
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout=ACQUIRE_TIMEOUT):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._opened < self.size:
+                self._opened += 1
+                try:
+                    return self.factory()
+                except Exception:
+                    self._opened -= 1
+                    raise
+
+        try:
+            return self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise PoolExhausted(f"all {self.size} connections busy for {timeout}s") from None
+
+    def release(self, conn):
+        try:
+            # never hand a half-finished transaction to the next request
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.ProgrammingError:
+            # the connection was closed by its user; forget about it
+            with self._lock:
+                self._opened -= 1
+            return
+        self._idle.put_nowait(conn)
+
+    def close_all(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._opened -= 1
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # the first request of each process brings the schema up to date
+                conn = connect()
+                migrations.migrate(conn)
+                conn.close()
+                _pool = ConnectionPool()
+    return _pool
+
+
+def get_connection():
+    """Return a database connection.
+
+    Inside a Flask request the same pooled connection is reused for the whole
+    request and handed back by `close_connection` on teardown, so callers
+    should not close it. Outside Flask (scripts like init_db.py) a new
+    connection is returned and the caller closes it.
+    """
+    if not has_app_context():
+        return connect()
+
+    if "db" not in g:
+        # instrumentation.py can wrap the connection to time queries
+        wrap = current_app.extensions.get("db_connection_wrapper")
+        g.db = wrap(get_pool().acquire) if wrap is not None else get_pool().acquire()
+    return g.db
+
+
+def close_connection(exception=None):
+    conn = g.pop("db", None)
+    if conn is not None:
+        get_pool().release(getattr(conn, "raw", conn))
+
+
+def _pool_exhausted(exc):
+    return "Server busy, please try again shortly", 503, {"Retry-After": "1"}
+
+
+def init_app(app):
+    app.teardown_appcontext(close_connection)
+    app.register_error_handler(PoolExhausted, _pool_exhausted)
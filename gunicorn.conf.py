@@ -0,0 +1,54 @@
+"""gunicorn settings, picked up by `gunicorn app:app` run from this directory.
+
+The app is preloaded in the master (serve.preload), each worker follows the
+replica and warms up after the fork (serve.warm_up), and the background
+jobs run in one extra process (`python jobs.py`) that the master starts
+once it is ready and stops when it exits; MOVIE_BOOKING_JOBS=0 leaves them
+out. `python serve.py` is a shorthand for running this with flags.
+
+On SIGTERM workers stop accepting and finish the requests they have;
+anything still running graceful_timeout seconds later, open /events streams
+included, is cut.
+"""
+import os
+import subprocess
+import sys
+
+import serve
+
+bind = os.environ.get("MOVIE_BOOKING_BIND", "127.0.0.1:8000")
+workers = serve.WORKERS
+threads = serve.THREADS
+worker_class = "gthread"
+preload_app = True
+graceful_timeout = 30
+backlog = 1024
+
+# gthread workers run /events streams (seat_events.py) on their request
+# threads, so keep streams to half of them; and give every thread a
+# connection. Both are read when the app is loaded, which is after this file.
+os.environ.setdefault("MOVIE_BOOKING_MAX_STREAMS", str(max(1, threads // 2)))
+os.environ.setdefault("MOVIE_BOOKING_POOL_SIZE", str(threads))
+
+_jobs = None
+
+
+def when_ready(server):
+    global _jobs
+    serve.preload()
+    if serve.RUN_JOBS:
+        _jobs = subprocess.Popen([sys.executable, os.path.join(serve.HERE, "jobs.py")])
+
+
+def post_fork(server, worker):
+    import replica
+    from app import app
+
+    replica.replica.follow()
+    serve.warm_up(app, threads)
+
+
+def on_exit(server):
+    if _jobs is not None:
+        _jobs.terminate()
+        _jobs.wait()
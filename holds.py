@@ -0,0 +1,230 @@
+"""Short-lived seat holds.
+
+Picking a seat on the seat page places a hold on it for HOLD_TTL seconds,
+so whoever picked it first can finish booking without losing it at submit
+time. Holds live in the `seat_holds` table, one row per held seat:
+
+* place_holds / extend_holds / release_holds each run in one short write
+  transaction and are all-or-nothing for the seats they are given;
+* reserve_seats (reservations.py) won't book a seat someone else holds, and
+  drops the buyer's own holds once the booking commits;
+* one holder can hold at most MAX_HELD_SEATS_PER_HOLDER seats, and renewing
+  can't keep a hold past MAX_HOLD_LIFETIME from when it was placed, so
+  nobody can sit on a showtime forever;
+* a hold past its expires_at is treated as gone everywhere, so expiry never
+  waits for the sweeper. sweep_expired() deletes dead rows, a batch per
+  transaction so it never keeps the write lock for long; the delete is what
+  logs the seat as free for live viewers (seat_events.py), so the background
+  sweeper runs every second.
+
+Times use the "YYYY-MM-DD HH:MM:SS" format of the rest of the schema, but
+in UTC rather than local time, so a DST change can't stretch or cut short a
+hold (see timeformat.py). In SQL that is datetime('now').
+
+    python holds.py             # sweep once and exit (e.g. from cron)
+    python holds.py --forever   # keep sweeping every SWEEP_INTERVAL
+"""
+import os
+import time
+from datetime import timedelta
+
+import jobs
+import timeformat
+from reservations import SeatsUnavailable, _parse_seat_ids
+
+HOLD_TTL = float(os.environ.get("MOVIE_BOOKING_HOLD_TTL", "300"))
+MAX_HOLD_LIFETIME = float(os.environ.get("MOVIE_BOOKING_MAX_HOLD_LIFETIME", "900"))
+MAX_HELD_SEATS_PER_HOLDER = int(os.environ.get("MOVIE_BOOKING_MAX_HELD_SEATS", "10"))
+# expires_at has one-second resolution, so sweeping more often gains nothing
+SWEEP_INTERVAL = float(os.environ.get("MOVIE_BOOKING_SWEEP_INTERVAL", "1"))
+SWEEP_BATCH = 1000
+# between batches, so bookings queued on the write lock get their turn
+SWEEP_PAUSE = 0.01
+
+
+class HoldLimitExceeded(Exception):
+    """Raised when placing holds would take a holder past `limit` seats."""
+
+    def __init__(self, limit):
+        super().__init__(f"at most {limit} seats can be held at once")
+        self.limit = limit
+
+
+def _now(now=None):
+    return timeformat.to_storage(now or timeformat.utc_now())
+
+
+def _expiry(ttl, now=None):
+    return timeformat.to_storage((now or timeformat.utc_now()) + timedelta(seconds=ttl))
+
+
+def _lifetime(lifetime):
+    """SQLite datetime() modifier for the end of a hold's lifetime."""
+    return f"+{int(lifetime)} seconds"
+
+
+def place_holds(
+    conn,
+    showtime_id,
+    seat_ids,
+    holder,
+    ttl=HOLD_TTL,
+    max_seats=MAX_HELD_SEATS_PER_HOLDER,
+    lifetime=MAX_HOLD_LIFETIME,
+):
+    """Hold every seat in `seat_ids` for `holder`, or none of them.
+
+    Seats the holder already holds are renewed, up to `lifetime` after they
+    were first placed. Returns (seat_ids, earliest expires_at). Raises SeatsUnavailable
+    listing seats that are booked, held by someone else or not part of the
+    showtime, and HoldLimitExceeded if the holder would end up holding more
+    than `max_seats` seats across all showtimes.
+    """
+    requested, invalid = _parse_seat_ids(seat_ids)
+    if invalid:
+        raise SeatsUnavailable(invalid)
+    if not requested:
+        return [], None
+
+    placeholders = ",".join("?" for _ in requested)
+    now, expires_at = _now(), _expiry(ttl)
+
+    conn.execute("BEGIN IMMEDIATE;")
+    try:
+        others = conn.execute(
+            f"""
+            SELECT COUNT(*) FROM seat_holds
+            WHERE holder = ? AND expires_at > ? AND seat_id NOT IN ({placeholders});
+            """,
+            (holder, now, *requested),
+        ).fetchone()[0]
+        if others + len(requested) > max_seats:
+            conn.rollback()
+            raise HoldLimitExceeded(max_seats)
+
+        # a live hold of our own keeps its placed_at, so renewing it is capped
+        held = conn.execute(
+            f"""
+            INSERT INTO seat_holds (seat_id, showtime_id, holder, placed_at, expires_at)
+            SELECT id, showtime_id, ?, ?, ? FROM seats
+            WHERE showtime_id = ? AND is_booked = 0 AND id IN ({placeholders})
+            ON CONFLICT (seat_id) DO UPDATE SET
+                holder = excluded.holder,
+                placed_at = CASE WHEN seat_holds.expires_at > ?
+                    THEN seat_holds.placed_at ELSE excluded.placed_at END,
+                expires_at = CASE WHEN seat_holds.expires_at > ?
+                    THEN MIN(excluded.expires_at, datetime(seat_holds.placed_at, ?))
+                    ELSE excluded.expires_at END
+            WHERE seat_holds.holder = excluded.holder OR seat_holds.expires_at <= ?
+            RETURNING seat_id, expires_at;
+            """,
+            (holder, now, expires_at, showtime_id, *requested, now, now, _lifetime(lifetime), now),
+        ).fetchall()
+        expires_at = min(row[1] for row in held) if held else None
+        held = {row[0] for row in held}
+
+        lost = requested - held
+        if lost:
+            conn.rollback()
+            raise SeatsUnavailable(lost)
+        conn.commit()
+    except (SeatsUnavailable, HoldLimitExceeded):
+        raise
+    except Exception:
+        conn.rollback()
+        raise
+    return sorted(held), expires_at
+
+
+def extend_holds(conn, showtime_id, holder, ttl=HOLD_TTL, lifetime=MAX_HOLD_LIFETIME):
+    """Push back the expiry of the holder's live holds, never past `lifetime`
+    after each was placed.
+
+    Returns (seat_ids, expires_at), expires_at being the earliest of the
+    new expiries, or None if there was nothing to extend.
+    """
+    conn.execute("BEGIN IMMEDIATE;")
+    try:
+        rows = conn.execute(
+            """
+            UPDATE seat_holds SET expires_at = MIN(?, datetime(placed_at, ?))
+            WHERE showtime_id = ? AND holder = ? AND expires_at > ?
+            RETURNING seat_id, expires_at;
+            """,
+            (_expiry(ttl), _lifetime(lifetime), showtime_id, holder, _now()),
+        ).fetchall()
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return sorted(row[0] for row in rows), min((row[1] for row in rows), default=None)
+
+
+def release_holds(conn, showtime_id, holder, seat_ids=None):
+    """Drop the holder's holds on `seat_ids` (all of them if None). Returns the released ids."""
+    clauses, params = ["showtime_id = ?", "holder = ?"], [showtime_id, holder]
+    if seat_ids is not None:
+        requested, _ = _parse_seat_ids(seat_ids)
+        if not requested:
+            return []
+        clauses.append(f"seat_id IN ({','.join('?' for _ in requested)})")
+        params.extend(requested)
+
+    conn.execute("BEGIN IMMEDIATE;")
+    try:
+        rows = conn.execute(
+            f"DELETE FROM seat_holds WHERE {' AND '.join(clauses)} RETURNING seat_id;",
+            params,
+        ).fetchall()
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return sorted(row[0] for row in rows)
+
+
+def active_holds(conn, showtime_id):
+    """{seat_id: (holder, expires_at)} for the showtime's live holds."""
+    rows = conn.execute(
+        "SELECT seat_id, holder, expires_at FROM seat_holds WHERE showtime_id = ? AND expires_at > ?;",
+        (showtime_id, _now()),
+    )
+    return {seat_id: (holder, expires_at) for seat_id, holder, expires_at in rows}
+
+
+def sweep_expired(conn, batch_size=SWEEP_BATCH, now=None, pause=SWEEP_PAUSE):
+    """Delete holds expired by `now` (UTC), `batch_size` rows per transaction.
+    Returns how many."""
+    cutoff = _now(now)
+    # most runs find nothing; don't take the write lock for those
+    if conn.execute("SELECT 1 FROM seat_holds WHERE expires_at <= ? LIMIT 1;", (cutoff,)).fetchone() is None:
+        return 0
+    swept = 0
+    while True:
+        conn.execute("BEGIN IMMEDIATE;")
+        try:
+            deleted = conn.execute(
+                """
+                DELETE FROM seat_holds WHERE seat_id IN (
+                    SELECT seat_id FROM seat_holds WHERE expires_at <= ? LIMIT ?
+                );
+                """,
+                (cutoff, batch_size),
+            ).rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        swept += deleted
+        if deleted < batch_size:
+            return swept
+        time.sleep(pause)
+
+
+def start_background(interval=SWEEP_INTERVAL):
+    """Sweep expired holds every `interval` seconds (see jobs.every)."""
+    return jobs.every("hold-sweeper", interval, sweep_expired, with_connection=True)
+
+
+if __name__ == "__main__":
+    jobs.run_cli(sweep_expired, SWEEP_INTERVAL, "Swept {} expired holds.")
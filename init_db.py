@@ -1,60 +1,49 @@
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import migrations
+import timeformat
 from database import get_connection
+from reservations import CODE_ALPHABET, CODE_LENGTH
 
 
-def create_tables():
-    conn = get_connection()
+def drop_tables(conn):
     cur = conn.cursor()
-
+    cur.execute("DROP TABLE IF EXISTS seat_changes;")
+    cur.execute("DROP TABLE IF EXISTS seat_holds;")
+    cur.execute("DROP TABLE IF EXISTS catalog_version;")
+    cur.execute("DROP TABLE IF EXISTS job_watermarks;")
+    cur.execute("DROP TABLE IF EXISTS booking_rollups;")
+    cur.execute("DROP TABLE IF EXISTS showtime_occupancy;")
     cur.execute("DROP TABLE IF EXISTS bookings;")
+    cur.execute("DROP TABLE IF EXISTS orders;")
     cur.execute("DROP TABLE IF EXISTS seats;")
     cur.execute("DROP TABLE IF EXISTS showtimes;")
     cur.execute("DROP TABLE IF EXISTS movies;")
+    cur.execute("PRAGMA user_version = 0;")
+    conn.commit()
 
-    cur.execute("""
-        CREATE TABLE movies (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT NOT NULL,
-            description TEXT,
-            rating TEXT,
-            duration_minutes INTEGER
-        );
-    """)
-
-    cur.execute("""
-        CREATE TABLE showtimes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            movie_id INTEGER NOT NULL,
-            start_time TEXT NOT NULL,
-            screen_name TEXT,
-            FOREIGN KEY (movie_id) REFERENCES movies(id)
-        );
-    """)
-
-    cur.execute("""
-        CREATE TABLE seats (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            showtime_id INTEGER NOT NULL,
-            row_label TEXT NOT NULL,
-            seat_number INTEGER NOT NULL,
-            is_booked INTEGER DEFAULT 0,
-            FOREIGN KEY (showtime_id) REFERENCES showtimes(id)
-        );
-    """)
-
-    cur.execute("""
-        CREATE TABLE bookings (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            showtime_id INTEGER NOT NULL,
-            seat_id INTEGER NOT NULL,
-            customer_name TEXT,
-            confirmation_code TEXT NOT NULL,
-            FOREIGN KEY (showtime_id) REFERENCES showtimes(id),
-            FOREIGN KEY (seat_id) REFERENCES seats(id)
-        );
-    """)
 
-    conn.commit()
+def create_tables(reset=False):
+    """Create or upgrade the schema in place. `reset` wipes everything first."""
+    conn = get_connection()
+
+    if reset:
+        drop_tables(conn)
+
+    applied = migrations.migrate(conn)
+    conn.close()
+    return applied
+
+
+def has_movies():
+    conn = get_connection()
+    count = conn.execute("SELECT COUNT(*) FROM movies;").fetchone()[0]
     conn.close()
+    return count > 0
 
 
 def seed_data():
@@ -64,8 +53,8 @@ def seed_data():
     # 1) Insert Avatar
     cur.execute(
         """
-        INSERT INTO movies (title, description, rating, duration_minutes)
-        VALUES (?, ?, ?, ?);
+        INSERT INTO movies (title, description, rating, duration_minutes, poster)
+        VALUES (?, ?, ?, ?, ?);
         """,
         (
             "Avatar",
@@ -73,6 +62,7 @@ def seed_data():
             "becomes torn between following his orders and protecting the world he feels is his home.",
             "PG-13",
             162,
+            "avatar.jpg",
         ),
     )
     avatar_id = cur.lastrowid
@@ -80,14 +70,15 @@ def seed_data():
     # 2) Insert Twilight
     cur.execute(
         """
-        INSERT INTO movies (title, description, rating, duration_minutes)
-        VALUES (?, ?, ?, ?);
+        INSERT INTO movies (title, description, rating, duration_minutes, poster)
+        VALUES (?, ?, ?, ?, ?);
         """,
         (
             "Twilight",
             "A teenage girl risks everything when she falls in love with a vampire.",
             "PG-13",
             122,
+            "twilight.jpg",
         ),
     )
     twilight_id = cur.lastrowid
@@ -95,14 +86,15 @@ def seed_data():
     # Inserted Wicked: For Good
     cur.execute(
         """
-        INSERT INTO movies (title, description, rating, duration_minutes)
-        VALUES (?, ?, ?, ?);
+        INSERT INTO movies (title, description, rating, duration_minutes, poster)
+        VALUES (?, ?, ?, ?, ?);
         """,
         (
             "Wicked: For Good",
             "Now demonized as the Wicked Witch of the West, Elphaba lives in exile in the Ozian forest, while Glinda resides at the palace in Emerald City, reveling in the perks of fame and popularity. As an angry mob rises against the Wicked Witch, she'll need to reunite with Glinda to transform herself, and all of Oz, for good.",
             "PG",
             138,
+            "wicked.jpg",
         ),
     )
     wicked_id = cur.lastrowid
@@ -111,14 +103,15 @@ def seed_data():
     # Insert Jurassic World Rebirth
     cur.execute(
         """
-        INSERT INTO movies (title, description, rating, duration_minutes)
-        VALUES (?, ?, ?, ?);
+        INSERT INTO movies (title, description, rating, duration_minutes, poster)
+        VALUES (?, ?, ?, ?, ?);
         """,
         (
             "Jurassic World Rebirth",
             "Zora Bennett leads a team of skilled operatives to the most dangerous place on Earth, an island research facility for the original Jurassic Park.",
             "PG-13",
             134,
+            "jurassic.jpg",
         ),
     )
     jurassicworld_id = cur.lastrowid
@@ -126,14 +119,15 @@ def seed_data():
     # Insert Black Panther
     cur.execute(
         """
-        INSERT INTO movies (title, description, rating, duration_minutes)
-        VALUES (?, ?, ?, ?);
+        INSERT INTO movies (title, description, rating, duration_minutes, poster)
+        VALUES (?, ?, ?, ?, ?);
         """,
         (
             "Black Panther",
             "After the death of his father, T'Challa returns home to the African nation of Wakanda to take his rightful place as king.",
             "PG-13",
             135,
+            "black-panther.jpg",
         ),
     )
     blackpanther_id = cur.lastrowid
@@ -141,29 +135,29 @@ def seed_data():
     # 3) Insert showtimes for all movies
     showtimes_data = [
         # Avatar showtimes
-        (avatar_id,   "12-10-2025 7:30pm", "Screen 1"),
-        (avatar_id,   "12-10-2025 9:30pm", "Screen 2"),
-        (avatar_id,   "12-11-2025 6:00pm", "Screen 3"),
+        (avatar_id,   "2025-12-10 19:30:00", "Screen 1"),
+        (avatar_id,   "2025-12-10 21:30:00", "Screen 2"),
+        (avatar_id,   "2025-12-11 18:00:00", "Screen 3"),
 
         # Twilight showtimes
-        (twilight_id, "12-10-2025 8:00pm", "Screen 1"),
-        (twilight_id, "12-11-2025 7:00pm", "Screen 2"),
-        (twilight_id, "12-12-2025 9:15pm", "Screen 3"),
+        (twilight_id, "2025-12-10 20:00:00", "Screen 1"),
+        (twilight_id, "2025-12-11 19:00:00", "Screen 2"),
+        (twilight_id, "2025-12-12 21:15:00", "Screen 3"),
 
         # Jurassic World Rebirth Showtimes
-        (jurassicworld_id, "12-14-2025 7:00pm", "Screen 1"),
-        (jurassicworld_id, "12-14-2025 9:45pm", "Screen 2"),
-        (jurassicworld_id, "12-14-2025 11:15pm", "Screen 3"),
+        (jurassicworld_id, "2025-12-14 19:00:00", "Screen 1"),
+        (jurassicworld_id, "2025-12-14 21:45:00", "Screen 2"),
+        (jurassicworld_id, "2025-12-14 23:15:00", "Screen 3"),
 
         # Black Panther Showtimes
-        (blackpanther_id, "12-13-2025 6:00pm", "Screen 1"),
-        (blackpanther_id, "12-13-2025 8:15pm", "Screen 2"),
-        (blackpanther_id, "12-13-2025 10:45pm", "Screen 3"),
+        (blackpanther_id, "2025-12-13 18:00:00", "Screen 1"),
+        (blackpanther_id, "2025-12-13 20:15:00", "Screen 2"),
+        (blackpanther_id, "2025-12-13 22:45:00", "Screen 3"),
 
         #Wicked showtimes
-        (wicked_id, "12-10-2025 10:30pm", "Screen 1"),
-        (wicked_id, "12-11-2025 5:45pm", "Screen 2"),
-        (wicked_id, "12-12-2025 8:20pm", "Screen 3"),
+        (wicked_id, "2025-12-10 22:30:00", "Screen 1"),
+        (wicked_id, "2025-12-11 17:45:00", "Screen 2"),
+        (wicked_id, "2025-12-12 20:20:00", "Screen 3"),
     ]
 
     showtime_ids = []
@@ -181,23 +175,301 @@ def seed_data():
     rows = ["A", "B", "C", "D"]
     seats_per_row = 10
 
-    for st_id in showtime_ids:
-        for row_label in rows:
-            for seat_number in range(1, seats_per_row + 1):
-                cur.execute(
-                    """
-                    INSERT INTO seats (showtime_id, row_label, seat_number, is_booked)
-                    VALUES (?, ?, ?, 0);
-                    """,
-                    (st_id, row_label, seat_number),
-                )
+    cur.executemany(
+        """
+        INSERT INTO seats (showtime_id, row_label, seat_number, is_booked)
+        VALUES (?, ?, ?, 0);
+        """,
+        (
+            (st_id, row_label, seat_number)
+            for st_id in showtime_ids
+            for row_label in rows
+            for seat_number in range(1, seats_per_row + 1)
+        ),
+    )
 
     conn.commit()
     conn.close()
 
 
+# ---------------------------------------------------------------------------
+# Synthetic data for benchmarks
+# ---------------------------------------------------------------------------
+
+RATINGS = ["G", "PG", "PG-13", "R"]
+
+
+def row_label_for(index):
+    """0 -> A, 25 -> Z, 26 -> AA, ... so layouts can have any number of rows."""
+    label = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        label = chr(ord("A") + remainder) + label
+    return label
+
+
+def synthetic_code(order_id):
+    """A confirmation code that looks random but is unique per order id.
+
+    Multiplying by an odd constant modulo 32**CODE_LENGTH (a power of two)
+    is a bijection, so no two ids share a code and no uniqueness check is
+    needed while bulk loading.
+    """
+    value = order_id * 0x9E3779B97F4A7C15 % len(CODE_ALPHABET) ** CODE_LENGTH
+    digits = []
+    for _ in range(CODE_LENGTH):
+        value, digit = divmod(value, len(CODE_ALPHABET))
+        digits.append(CODE_ALPHABET[digit])
+    return "".join(digits)
+
+
+def _next_id(cur, table):
+    return cur.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {table};").fetchone()[0]
+
+
+def _booked_orders(seed, showtime_id, seat_count, occupancy):
+    """The pre-booked orders of one showtime, as runs of seat positions.
+
+    Each showtime gets its own RNG seeded from (seed, showtime_id), so the
+    seats and bookings generators below agree without sharing state. The
+    showtime's occupancy is drawn from a beta distribution around
+    `occupancy`, so some shows sell out and some stay nearly empty. Booked
+    seats come in runs of 1-6, like real orders.
+    """
+    if occupancy <= 0:
+        return []
+    rng = random.Random(seed * 1_000_003 + showtime_id)
+    concentration = 4.0
+    rate = rng.betavariate(occupancy * concentration, (1 - occupancy) * concentration) if occupancy < 1 else 1.0
+    target = round(rate * seat_count)
+
+    # spread the free seats as gaps between orders (mean order size is 3.5)
+    mean_gap = (seat_count - target) / max(1.0, target / 3.5)
+
+    orders, taken, position = [], 0, 0
+    while taken < target and position < seat_count:
+        size = min(rng.randint(1, 6), target - taken, seat_count - position)
+        orders.append(range(position, position + size))
+        taken += size
+        position += size + rng.randint(0, int(2 * mean_gap))
+    return orders
+
+
+def generate_data(
+    movies=50,
+    screens=10,
+    days=30,
+    shows_per_day=4,
+    rows=15,
+    seats_per_row=20,
+    occupancy=0.0,
+    start_date="2025-12-01",
+    seed=1,
+):
+    """Fill the database with a large, reproducible synthetic catalog.
+
+    Every screen gets `shows_per_day` showtimes a day for `days` days, each
+    with a rows x seats_per_row layout. `occupancy` (0-1) is the mean
+    fraction of seats pre-booked per showtime. Everything is streamed into
+    executemany from generators inside one transaction. Returns
+    ({table: rows inserted}, elapsed seconds).
+    """
+    rng = random.Random(seed)
+    conn = get_connection()
+    cur = conn.cursor()
+    started = time.perf_counter()
+    seat_count = rows * seats_per_row
+    labels = [row_label_for(i) for i in range(rows)]
+    first_day = datetime.strptime(start_date, "%Y-%m-%d")
+
+    # The generated rows reference each other correctly by construction, so
+    # skip per-row foreign key checks. This can't change inside a transaction.
+    cur.execute("PRAGMA foreign_keys = OFF;")
+    cur.execute("BEGIN IMMEDIATE;")
+    try:
+        first_movie = _next_id(cur, "movies")
+        durations = [rng.randint(85, 180) for _ in range(movies)]
+        cur.executemany(
+            """
+            INSERT INTO movies (id, title, description, rating, duration_minutes)
+            VALUES (?, ?, ?, ?, ?);
+            """,
+            (
+                (
+                    first_movie + i,
+                    f"Synthetic Movie {i + 1:04d}",
+                    "Generated for benchmarks.",
+                    rng.choice(RATINGS),
+                    durations[i],
+                )
+                for i in range(movies)
+            ),
+        )
+
+        # showtimes are spread evenly from noon, each playing a random movie
+        slot = timedelta(hours=12) / shows_per_day
+        showtime_specs = []  # (movie index, screen index, start) in id order
+        for day in range(days):
+            for screen in range(screens):
+                for show in range(shows_per_day):
+                    start = first_day + timedelta(days=day, hours=12) + slot * show
+                    showtime_specs.append((rng.randrange(movies), screen, start))
+
+        first_showtime = _next_id(cur, "showtimes")
+        cur.executemany(
+            """
+            INSERT INTO showtimes (id, movie_id, start_time, end_time, screen_name)
+            VALUES (?, ?, ?, ?, ?);
+            """,
+            (
+                (
+                    first_showtime + i,
+                    first_movie + movie,
+                    timeformat.to_storage(start),
+                    timeformat.to_storage(start + timedelta(minutes=durations[movie])),
+                    f"Screen {screen + 1}",
+                )
+                for i, (movie, screen, start) in enumerate(showtime_specs)
+            ),
+        )
+        showtime_ids = range(first_showtime, first_showtime + len(showtime_specs))
+
+        def booked_positions(showtime_id):
+            return set(
+                position
+                for order in _booked_orders(seed, showtime_id, seat_count, occupancy)
+                for position in order
+            )
+
+        first_seat = _next_id(cur, "seats")
+
+        def seat_rows():
+            for n, showtime_id in enumerate(showtime_ids):
+                booked = booked_positions(showtime_id)
+                base = first_seat + n * seat_count
+                for position in range(seat_count):
+                    row, number = divmod(position, seats_per_row)
+                    yield (base + position, showtime_id, labels[row], number + 1, int(position in booked))
+
+        # The occupancy trigger would upsert once per seat; fill the counters in
+        # one statement instead. DDL is transactional, so nobody ever sees the
+        # trigger missing.
+        trigger_sql = cur.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'trg_seats_occupancy_insert';"
+        ).fetchone()[0]
+        cur.execute("DROP TRIGGER trg_seats_occupancy_insert;")
+        cur.executemany(
+            """
+            INSERT INTO seats (id, showtime_id, row_label, seat_number, is_booked)
+            VALUES (?, ?, ?, ?, ?);
+            """,
+            seat_rows(),
+        )
+        cur.execute(
+            """
+            INSERT INTO showtime_occupancy (showtime_id, total_seats, booked_seats)
+            SELECT showtime_id, COUNT(*), SUM(is_booked)
+            FROM seats
+            WHERE showtime_id >= ? AND showtime_id < ?
+            GROUP BY showtime_id;
+            """,
+            (showtime_ids.start, showtime_ids.stop),
+        )
+        cur.execute(trigger_sql)
+
+        booked_at = timeformat.to_storage(first_day - timedelta(days=1))
+        first_order = _next_id(cur, "orders")
+
+        def orders_by_showtime():
+            order_id = first_order
+            for n, showtime_id in enumerate(showtime_ids):
+                base = first_seat + n * seat_count
+                for order in _booked_orders(seed, showtime_id, seat_count, occupancy):
+                    yield order_id, synthetic_code(order_id), showtime_id, [base + p for p in order]
+                    order_id += 1
+
+        cur.executemany(
+            "INSERT INTO orders (id, code, showtime_id, customer_name, created_at) VALUES (?, ?, ?, ?, ?);",
+            (
+                (order_id, code, showtime_id, "Synthetic", booked_at)
+                for order_id, code, showtime_id, _ in orders_by_showtime()
+            ),
+        )
+        order_count = cur.rowcount
+        cur.executemany(
+            """
+            INSERT INTO bookings (showtime_id, seat_id, customer_name, confirmation_code, booked_at, order_id)
+            VALUES (?, ?, ?, ?, ?, ?);
+            """,
+            (
+                (showtime_id, seat_id, "Synthetic", code, booked_at, order_id)
+                for order_id, code, showtime_id, seat_ids in orders_by_showtime()
+                for seat_id in seat_ids
+            ),
+        )
+        booking_count = cur.rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.execute("PRAGMA foreign_keys = ON;")
+        conn.close()
+
+    elapsed = time.perf_counter() - started
+    counts = {
+        "movies": movies,
+        "showtimes": len(showtime_specs),
+        "seats": len(showtime_specs) * seat_count,
+        "bookings": booking_count,
+        "orders": order_count,
+    }
+    return counts, elapsed
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description="Create, upgrade or fill the movie booking database.")
+    parser.add_argument("--reset", action="store_true", help="drop everything and start over")
+    parser.add_argument("--generate", action="store_true", help="fill with synthetic data instead of the demo movies")
+    parser.add_argument("--movies", type=int, default=50)
+    parser.add_argument("--screens", type=int, default=10)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--shows-per-day", type=int, default=4)
+    parser.add_argument("--rows", type=int, default=15)
+    parser.add_argument("--seats-per-row", type=int, default=20)
+    parser.add_argument("--occupancy", type=float, default=0.0, help="mean fraction of seats pre-booked (0-1)")
+    parser.add_argument("--start-date", default="2025-12-01")
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args(argv)
+
 
 if __name__ == "__main__":
-    create_tables()
-    seed_data()
-    print("Database initialized and seeded with Avatar movie + showtimes + seats.")
+    # python init_db.py             upgrade the schema in place, seed if empty
+    # python init_db.py --reset     drop everything and start over
+    # python init_db.py --generate  drop everything and load synthetic data
+    args = _parse_args(sys.argv[1:])
+    reset = args.reset or args.generate
+    for version, name in create_tables(reset=reset):
+        print(f"Applied migration {version}: {name}")
+
+    if args.generate:
+        counts, elapsed = generate_data(
+            movies=args.movies,
+            screens=args.screens,
+            days=args.days,
+            shows_per_day=args.shows_per_day,
+            rows=args.rows,
+            seats_per_row=args.seats_per_row,
+            occupancy=args.occupancy,
+            start_date=args.start_date,
+            seed=args.seed,
+        )
+        total = sum(counts.values())
+        print(", ".join(f"{count} {table}" for table, count in counts.items()))
+        print(f"Generated {total} rows in {elapsed:.2f}s ({total / elapsed:,.0f} rows/sec).")
+    elif reset or not has_movies():
+        seed_data()
+        print("Database initialized and seeded with movies + showtimes + seats.")
+    else:
+        print(f"Database is up to date (schema version {migrations.LATEST_VERSION}).")
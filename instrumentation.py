@@ -0,0 +1,290 @@
+"""Opt-in request profiling and query metrics.
+
+Set MOVIE_BOOKING_METRICS=1 to turn it on. Each request then gets:
+
+* per-query timing and row counts, via a thin wrapper around the connection
+  get_connection() hands out,
+* a Server-Timing response header splitting the request into connection
+  acquire, SQL, template rendering and total time,
+* Prometheus-style counters and latency histograms per route and per SQL
+  statement, served at /debug/metrics.
+
+When it is off, init_app() registers nothing, so requests pay nothing.
+"""
+import os
+import re
+import threading
+from time import perf_counter
+
+from flask import Response, before_render_template, g, request, template_rendered
+
+ENABLED = os.environ.get("MOVIE_BOOKING_METRICS", "") not in ("", "0", "false", "no")
+
+# seconds; the last bucket is +Inf
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+_COMMENT_RE = re.compile(r"--[^\n]*")
+_IN_LIST_RE = re.compile(r"\(\s*\?(\s*,\s*\?)*\s*\)")
+
+
+def statement_label(sql):
+    """One stable label per statement: no comments, one line, IN (?, ?) lists folded."""
+    sql = " ".join(_COMMENT_RE.sub("", sql).split())
+    return _IN_LIST_RE.sub("(?...)", sql)[:160]
+
+
+class Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.total += value
+        self.count += 1
+
+
+class Registry:
+    """Process-wide metrics, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}  # (route, method, status) -> count
+        self.request_seconds = {}  # route -> Histogram
+        self.queries = {}  # statement -> count
+        self.query_rows = {}  # statement -> rows fetched
+        self.query_seconds = {}  # statement -> Histogram
+
+    def record_request(self, route, method, status, seconds):
+        with self._lock:
+            key = (route, method, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.request_seconds.setdefault(route, Histogram()).observe(seconds)
+
+    def record_queries(self, queries):
+        with self._lock:
+            for statement, seconds, rows in queries:
+                self.queries[statement] = self.queries.get(statement, 0) + 1
+                self.query_rows[statement] = self.query_rows.get(statement, 0) + rows
+                self.query_seconds.setdefault(statement, Histogram()).observe(seconds)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            lines.append("# TYPE http_requests_total counter")
+            for (route, method, status), count in sorted(self.requests.items()):
+                lines.append(f'http_requests_total{{route="{route}",method="{method}",status="{status}"}} {count}')
+            _render_histograms(lines, "http_request_duration_seconds", "route", self.request_seconds)
+
+            lines.append("# TYPE sql_queries_total counter")
+            for statement, count in sorted(self.queries.items()):
+                lines.append(f'sql_queries_total{{statement="{_escape(statement)}"}} {count}')
+            lines.append("# TYPE sql_rows_total counter")
+            for statement, rows in sorted(self.query_rows.items()):
+                lines.append(f'sql_rows_total{{statement="{_escape(statement)}"}} {rows}')
+            _render_histograms(lines, "sql_query_duration_seconds", "statement", self.query_seconds)
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def _render_histograms(lines, name, label, histograms):
+    lines.append(f"# TYPE {name} histogram")
+    for key, hist in sorted(histograms.items()):
+        key = _escape(key)
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ("+Inf",), hist.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{label}="{key}",le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_sum{{{label}="{key}"}} {hist.total:.6f}')
+        lines.append(f'{name}_count{{{label}="{key}"}} {hist.count}')
+
+
+registry = Registry()
+
+
+class RequestTimings:
+    """What one request spent its time on."""
+
+    __slots__ = ("started", "acquire", "queries", "render", "render_started")
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.acquire = 0.0
+        self.queries = []  # (statement, seconds, rows)
+        self.render = 0.0
+        self.render_started = None
+
+
+class InstrumentedCursor:
+    """Times execute and fetch calls and counts the rows they return."""
+
+    def __init__(self, cursor, timings):
+        self._cursor = cursor
+        self._timings = timings
+        self._statement = None
+        self._seconds = 0.0
+        self._rows = 0
+
+    def _flush(self):
+        if self._statement is not None:
+            self._timings.queries.append((self._statement, self._seconds, self._rows))
+            self._statement = None
+
+    def execute(self, sql, params=()):
+        self._flush()
+        self._statement, self._rows = statement_label(sql), 0
+        started = perf_counter()
+        try:
+            self._cursor.execute(sql, params)
+        finally:
+            self._seconds = perf_counter() - started
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self._flush()
+        self._statement, self._rows = statement_label(sql), 0
+        started = perf_counter()
+        try:
+            self._cursor.executemany(sql, seq_of_params)
+        finally:
+            self._seconds = perf_counter() - started
+        return self
+
+    def _timed_fetch(self, fetch, *args):
+        started = perf_counter()
+        result = fetch(*args)
+        self._seconds += perf_counter() - started
+        if isinstance(result, list):
+            self._rows += len(result)
+        elif result is not None:
+            self._rows += 1
+        return result
+
+    def fetchone(self):
+        return self._timed_fetch(self._cursor.fetchone)
+
+    def fetchall(self):
+        result = self._timed_fetch(self._cursor.fetchall)
+        self._flush()
+        return result
+
+    def fetchmany(self, size=None):
+        return self._timed_fetch(self._cursor.fetchmany, *(() if size is None else (size,)))
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                self._flush()
+                return
+            yield row
+
+    def close(self):
+        self._flush()
+        self._cursor.close()
+
+    def __del__(self):
+        self._flush()
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class InstrumentedConnection:
+    """Wraps a pooled sqlite3 connection; `raw` is what goes back to the pool."""
+
+    def __init__(self, raw, timings):
+        self.raw = raw
+        self._timings = timings
+
+    def cursor(self):
+        return InstrumentedCursor(self.raw.cursor(), self._timings)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+
+def _timings():
+    if "timings" not in g:
+        g.timings = RequestTimings()
+    return g.timings
+
+
+def wrap_connection(acquire):
+    timings = _timings()
+    started = perf_counter()
+    conn = acquire()
+    timings.acquire += perf_counter() - started
+    return InstrumentedConnection(conn, timings)
+
+
+def _before_request():
+    g.timings = RequestTimings()
+
+
+def _before_render(sender, template, context, **extra):
+    _timings().render_started = perf_counter()
+
+
+def _after_render(sender, template, context, **extra):
+    timings = _timings()
+    if timings.render_started is not None:
+        timings.render += perf_counter() - timings.render_started
+        timings.render_started = None
+
+
+def _after_request(response):
+    timings = g.pop("timings", None)
+    if timings is None:
+        return response
+    total = perf_counter() - timings.started
+    sql = sum(seconds for _, seconds, _ in timings.queries)
+
+    response.headers["Server-Timing"] = ", ".join(
+        [
+            f"acquire;dur={timings.acquire * 1000:.3f}",
+            f'sql;dur={sql * 1000:.3f};desc="{len(timings.queries)} queries"',
+            f"render;dur={timings.render * 1000:.3f}",
+            f"total;dur={total * 1000:.3f}",
+        ]
+    )
+
+    route = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+    registry.record_request(route, request.method, response.status_code, total)
+    registry.record_queries(timings.queries)
+    return response
+
+
+def metrics():
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4")
+
+
+def init_app(app, enabled=None):
+    """Hook instrumentation into `app` if enabled; otherwise do nothing."""
+    if not (ENABLED if enabled is None else enabled):
+        return False
+
+    app.extensions["db_connection_wrapper"] = wrap_connection
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
+    app.add_url_rule("/debug/metrics", "debug_metrics", metrics)
+    return True
@@ -0,0 +1,83 @@
+"""Periodic background jobs.
+
+Each job is a function run every few seconds in a daemon thread: the
+booking rollups (rollups.py), the hold sweeper (holds.py) and the replica
+refresher (replica.py). `every()` is the loop they share; a failed run is
+logged and retried at the next tick instead of killing the thread.
+
+start_all() starts the three of them. Run it in exactly one process per
+deployment: app.py's dev server, or this module on its own next to any
+other server (gunicorn.conf.py starts it that way).
+
+    python jobs.py    # run every background job until stopped
+"""
+import sys
+import threading
+import time
+
+import migrations
+from database import connect
+
+
+def _run(name, interval, task, stop, with_connection, immediately):
+    conn = None
+    if with_connection:
+        conn = connect()
+        migrations.migrate(conn)
+    args = (conn,) if conn is not None else ()
+    wait = 0 if immediately else interval
+    while not stop.wait(wait):
+        wait = interval
+        try:
+            task(*args)
+        except Exception as exc:  # keep the job alive; try again next tick
+            print(f"{name} failed: {exc}", file=sys.stderr)
+    if conn is not None:
+        conn.close()
+
+
+def every(name, interval, task, with_connection=False, immediately=False):
+    """Call `task()` every `interval` seconds in a daemon thread called `name`.
+
+    With `with_connection` the thread opens its own connection, migrated to
+    the latest schema, and passes it as `task(conn)`. With `immediately` the
+    first run happens right away instead of after one interval.
+
+    Returns an Event; set it to stop the thread.
+    """
+    stop = threading.Event()
+    threading.Thread(
+        target=_run,
+        args=(name, interval, task, stop, with_connection, immediately),
+        name=name,
+        daemon=True,
+    ).start()
+    return stop
+
+
+def run_cli(task, interval, message):
+    """Command line for a job module: run `task(conn)` once and print
+    `message.format(result)`; with --forever, again every `interval`."""
+    conn = connect()
+    migrations.migrate(conn)
+    print(message.format(task(conn)))
+    if "--forever" in sys.argv:
+        while True:
+            time.sleep(interval)
+            print(message.format(task(conn)))
+    conn.close()
+
+
+def start_all():
+    """Start every background job. Returns their stop Events."""
+    import holds
+    import replica
+    import rollups
+
+    return [rollups.start_background(), holds.start_background(), replica.replica.start_background()]
+
+
+if __name__ == "__main__":
+    start_all()
+    print("background jobs started", file=sys.stderr, flush=True)
+    threading.Event().wait()
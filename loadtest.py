@@ -0,0 +1,470 @@
+"""HTTP load test for every route.
+
+Generates a throwaway database with init_db.generate_data, then drives each
+route with many concurrent clients, either in-process through the Flask test
+client or over real HTTP against a local WSGI server. Results go to stdout
+as JSON (throughput, p50/p95/p99 latency, error and double-booking counts);
+a readable summary goes to stderr.
+
+    python loadtest.py                          # in-process
+    python loadtest.py --transport server       # over a local WSGI server
+    python loadtest.py --transport both --clients 32 > results.json
+    python loadtest.py --transport sse --subscribers 5000   # idle live-seat viewers
+    python loadtest.py --transport prefork --workers 1,2,4  # gunicorn, per worker count
+
+The prefork transport runs gunicorn with gunicorn.conf.py, the production
+setup, without the background jobs. It also reports cold start (seconds
+from launching gunicorn to its first 200) and runs the sse scenario against
+each server.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import selectors
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode
+
+_tmpdir = tempfile.mkdtemp(prefix="movie-load-")
+os.environ.setdefault("MOVIE_BOOKING_DB", os.path.join(_tmpdir, "load.db"))
+
+import database  # noqa: E402  (must come after MOVIE_BOOKING_DB is set)
+import init_db  # noqa: E402
+import occupancy  # noqa: E402
+import replica  # noqa: E402
+from app import app  # noqa: E402
+from reservations import find_inconsistencies  # noqa: E402
+
+
+class InProcessClient:
+    def __init__(self):
+        self.client = app.test_client()
+
+    def request(self, method, path, form=None):
+        response = self.client.open(path, method=method, data=form)
+        return response.status_code
+
+
+class ServerClient:
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+
+    def request(self, method, path, form=None):
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        try:
+            if form is None:
+                conn.request(method, path)
+            else:
+                body = urlencode(form, doseq=True)
+                conn.request(method, path, body, {"Content-Type": "application/x-www-form-urlencoded"})
+            response = conn.getresponse()
+            response.read()
+            return response.status
+        finally:
+            conn.close()
+
+
+def start_server():
+    """Serve the app from a threaded WSGI server on a free local port."""
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_prefork(workers, threads):
+    """Launch gunicorn on a free port. Returns (process, port, cold start seconds)."""
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "--config", "gunicorn.conf.py", "--bind", f"127.0.0.1:{port}", "app:app"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=dict(
+            os.environ,
+            MOVIE_BOOKING_WORKERS=str(workers),
+            MOVIE_BOOKING_THREADS=str(threads),
+            MOVIE_BOOKING_JOBS="0",
+        ),
+        stderr=subprocess.DEVNULL,
+    )
+    client = ServerClient("127.0.0.1", port)
+    deadline = started + 60
+    while True:
+        try:
+            if client.request("GET", "/") == 200:
+                return process, port, time.perf_counter() - started
+        except OSError:
+            pass
+        if process.poll() is not None or time.perf_counter() > deadline:
+            process.kill()
+            raise RuntimeError(f"gunicorn with {workers} workers did not come up")
+        time.sleep(0.01)
+
+
+def rss_bytes():
+    """Resident memory of this process (Linux), or None where /proc isn't there."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+
+
+def open_subscriber(host, port, showtime_id):
+    """An SSE viewer as a bare socket; returns it once the stream has started."""
+    sock = socket.create_connection((host, port), timeout=30)
+    sock.sendall(f"GET /showtime/{showtime_id}/events HTTP/1.1\r\nHost: {host}\r\n\r\n".encode())
+    head = b""
+    while b"retry:" not in head:
+        chunk = sock.recv(4096)
+        if not chunk:
+            raise ConnectionError("stream closed before it started")
+        head += chunk
+    if not head.startswith(b"HTTP/1.1 200") and not head.startswith(b"HTTP/1.0 200"):
+        raise ConnectionError(head.split(b"\r\n", 1)[0].decode())
+    return sock
+
+
+def run_sse(data, subscribers, seed, address=None, label="sse"):
+    """Park `subscribers` idle viewers on the hot showtimes, then book one seat
+    on each and time how long the change takes to reach every viewer.
+
+    Also times an ordinary page load while they are parked, which must not
+    wait behind the streams. Runs against a fresh local server, or the one
+    at `address` (whose memory this process can't see).
+    """
+    server = None
+    if address is None:
+        server = start_server()
+        address = server.server_address[:2]
+    host, port = address
+    showtimes = list(data.hot_seats)
+    socks = {showtime_id: [] for showtime_id in showtimes}
+    failed = 0
+    try:
+        rss_before = rss_bytes()
+        start = time.perf_counter()
+        for i in range(subscribers):
+            showtime_id = showtimes[i % len(showtimes)]
+            try:
+                socks[showtime_id].append(open_subscriber(host, port, showtime_id))
+            except OSError:
+                failed += 1
+        connect_seconds = time.perf_counter() - start
+        time.sleep(1)  # let the server threads settle into waiting
+        rss_after = rss_bytes()
+        connected = subscribers - failed
+
+        start = time.perf_counter()
+        try:
+            page_ok = ServerClient(host, port).request("GET", "/") == 200
+        except OSError:
+            page_ok = False
+        page_ms = (time.perf_counter() - start) * 1000
+
+        # one booking per hot showtime, each fanned out to its viewers
+        selector = selectors.DefaultSelector()
+        for sock_list in socks.values():
+            for sock in sock_list:
+                sock.setblocking(False)
+                selector.register(sock, selectors.EVENT_READ)
+        client = InProcessClient()
+        rng = random.Random(seed)
+        start = time.perf_counter()
+        for showtime_id in showtimes:
+            # earlier scenarios may have booked or held some of them already
+            for seat in rng.sample(data.hot_seats[showtime_id], len(data.hot_seats[showtime_id])):
+                if client.request("POST", f"/showtime/{showtime_id}/holds", {"seats": [str(seat)]}) == 200:
+                    break
+
+        pending, delivery = connected, []
+        while pending and time.perf_counter() - start < 30:
+            for key, _ in selector.select(timeout=1):
+                chunk = key.fileobj.recv(65536)
+                if b"event: seats" in chunk or not chunk:
+                    selector.unregister(key.fileobj)
+                    pending -= 1
+                    if chunk:
+                        delivery.append(time.perf_counter() - start)
+        selector.close()
+    finally:
+        for sock_list in socks.values():
+            for sock in sock_list:
+                sock.close()
+        if server is not None:
+            server.shutdown()
+
+    if server is None:
+        rss_before = rss_after = None
+    delivery.sort()
+    result = {
+        "subscribers": subscribers,
+        "connected": connected,
+        "connect_seconds": round(connect_seconds, 3),
+        "delivered": len(delivery),
+        "delivery_ms": {
+            "p50": round(percentile(delivery, 0.50) * 1000, 3) if delivery else None,
+            "p99": round(percentile(delivery, 0.99) * 1000, 3) if delivery else None,
+            "max": round(delivery[-1] * 1000, 3) if delivery else None,
+        },
+        "rss_mb": {
+            "before": round(rss_before / 2**20, 1) if rss_before else None,
+            "after": round(rss_after / 2**20, 1) if rss_after else None,
+        },
+        "bytes_per_subscriber": (rss_after - rss_before) // connected if rss_before and connected else None,
+        "page_while_streaming_ms": round(page_ms, 3),
+        # a viewer that never got the change, or couldn't connect, counts as an error, as does the page
+        "errors": subscribers - len(delivery) + (not page_ok),
+    }
+    memory = ""
+    if rss_before:
+        memory = (
+            f"rss {result['rss_mb']['before']} -> {result['rss_mb']['after']} MB "
+            f"(~{(result['bytes_per_subscriber'] or 0) / 1024:.0f} KB each)  "
+        )
+    print(
+        f"{label:<10} {connected} subscribers in {connect_seconds:.1f}s  "
+        f"{memory}delivered {len(delivery)}/{subscribers}  p99 {result['delivery_ms']['p99']}ms  "
+        f"page {'ok' if page_ok else 'FAILED'} in {page_ms:.0f}ms  errors {result['errors']}",
+        file=sys.stderr,
+    )
+    return result
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+class Dataset:
+    """Ids the scenarios pick from, read once from the generated database."""
+
+    def __init__(self, hot_showtimes):
+        conn = database.connect()
+        self.movie_ids = [r[0] for r in conn.execute("SELECT id FROM movies;")]
+        self.showtime_ids = [r[0] for r in conn.execute("SELECT id FROM showtimes;")]
+        self.codes = [r[0] for r in conn.execute("SELECT code FROM orders LIMIT 1000;")]
+        # POSTs all go to a few showtimes so buyers actually collide
+        self.hot_seats = {
+            showtime_id: [r[0] for r in conn.execute("SELECT id FROM seats WHERE showtime_id = ?;", (showtime_id,))]
+            for showtime_id in self.showtime_ids[:hot_showtimes]
+        }
+        conn.close()
+
+
+def scenarios(data):
+    """(name, method, make_request, ok_statuses); make_request(rng) -> (path, form)."""
+
+    def book(rng):
+        showtime_id = rng.choice(list(data.hot_seats))
+        seats = rng.sample(data.hot_seats[showtime_id], rng.randint(1, 4))
+        return f"/showtime/{showtime_id}/seats", {"seats": [str(s) for s in seats], "customer_name": "Load"}
+
+    return [
+        ("home", "GET", lambda rng: ("/", None), {200}),
+        ("movie_detail", "GET", lambda rng: (f"/movie/{rng.choice(data.movie_ids)}", None), {200}),
+        ("showtime_seats", "GET", lambda rng: (f"/showtime/{rng.choice(data.showtime_ids)}/seats", None), {200}),
+        ("booking_success", "GET", lambda rng: (f"/booking/{rng.choice(data.codes)}", None), {200}),
+        ("analytics", "GET", lambda rng: ("/analytics", None), {200}),
+        # 302 = booked and redirected; 200 = lost the race, seat page re-rendered
+        ("book_seats", "POST", book, {302, 200}),
+    ]
+
+
+def run_scenario(make_client, method, make_request, ok_statuses, clients, requests_per_client, seed):
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def worker(worker_seed):
+        rng = random.Random(worker_seed)
+        client = make_client()
+        mine, counts = [], {}
+        for _ in range(requests_per_client):
+            path, form = make_request(rng)
+            start = time.perf_counter()
+            try:
+                status = client.request(method, path, form)
+            except Exception:
+                status = "exception"
+            mine.append(time.perf_counter() - start)
+            counts[status] = counts.get(status, 0) + 1
+        with lock:
+            latencies.extend(mine)
+            for status, count in counts.items():
+                statuses[status] = statuses.get(status, 0) + count
+
+    threads = [threading.Thread(target=worker, args=(seed * 1000 + i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    total = len(latencies)
+    return {
+        "requests": total,
+        "seconds": round(elapsed, 4),
+        "throughput_rps": round(total / elapsed, 1),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50) * 1000, 3),
+            "p95": round(percentile(latencies, 0.95) * 1000, 3),
+            "p99": round(percentile(latencies, 0.99) * 1000, 3),
+            "max": round(latencies[-1] * 1000, 3),
+        },
+        "statuses": {str(k): v for k, v in sorted(statuses.items(), key=str)},
+        "errors": sum(v for k, v in statuses.items() if k not in ok_statuses),
+    }
+
+
+def run_transport(transport, data, clients, requests_per_client, seed, address=None):
+    """Run every scenario in-process, against a fresh local server, or
+    against an already running one at `address`."""
+    server = None
+    if transport == "server":
+        server = start_server()
+        address = server.server_address[:2]
+    if address is not None:
+        host, port = address
+
+        def make_client():
+            return ServerClient(host, port)
+    else:
+        make_client = InProcessClient
+
+    results = {}
+    try:
+        for name, method, make_request, ok_statuses in scenarios(data):
+            results[name] = run_scenario(
+                make_client, method, make_request, ok_statuses, clients, requests_per_client, seed
+            )
+            summarize(transport, name, results[name])
+    finally:
+        if server is not None:
+            server.shutdown()
+    return results
+
+
+def summarize(transport, name, result):
+    latency = result["latency_ms"]
+    print(
+        f"{transport:<10} {name:<16} {result['throughput_rps']:>9.1f} req/s  "
+        f"p50 {latency['p50']:>8.2f}ms  p95 {latency['p95']:>8.2f}ms  p99 {latency['p99']:>8.2f}ms  "
+        f"errors {result['errors']}",
+        file=sys.stderr,
+    )
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--transport", choices=["inprocess", "server", "both", "sse", "prefork"], default="inprocess")
+    parser.add_argument("--clients", type=int, default=16, help="concurrent clients per scenario")
+    parser.add_argument("--requests", type=int, default=100, help="requests per client per scenario")
+    parser.add_argument("--hot-showtimes", type=int, default=3, help="showtimes the POST scenario fights over")
+    parser.add_argument("--subscribers", type=int, default=2000, help="idle SSE viewers (--transport sse)")
+    parser.add_argument(
+        "--workers", default="1,2,4", help="comma-separated gunicorn worker counts (--transport prefork)"
+    )
+    parser.add_argument("--threads", type=int, default=16, help="threads per gunicorn worker (--transport prefork)")
+    parser.add_argument(
+        "--replica-interval", type=float, default=0, help="serve read-only pages from a snapshot refreshed this often"
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    # dataset size, passed to init_db.generate_data
+    parser.add_argument("--movies", type=int, default=20)
+    parser.add_argument("--screens", type=int, default=5)
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--shows-per-day", type=int, default=4)
+    parser.add_argument("--rows", type=int, default=15)
+    parser.add_argument("--seats-per-row", type=int, default=20)
+    parser.add_argument("--occupancy", type=float, default=0.3)
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    args = _parse_args(argv)
+
+    init_db.create_tables(reset=True)
+    counts, elapsed = init_db.generate_data(
+        movies=args.movies,
+        screens=args.screens,
+        days=args.days,
+        shows_per_day=args.shows_per_day,
+        rows=args.rows,
+        seats_per_row=args.seats_per_row,
+        occupancy=args.occupancy,
+        seed=args.seed,
+    )
+    print(f"dataset: {counts} in {elapsed:.2f}s", file=sys.stderr)
+    data = Dataset(args.hot_showtimes)
+    if args.replica_interval > 0:
+        replica.replica.interval = args.replica_interval
+        replica.replica.refresh()  # so the first requests already have one
+        replica.replica.start_background()
+
+    transports = ["inprocess", "server"] if args.transport == "both" else [args.transport]
+    output = {
+        "config": vars(args),
+        "dataset": counts,
+        "results": {},
+    }
+    for transport in transports:
+        if transport == "sse":
+            output["results"]["sse"] = {"idle_subscribers": run_sse(data, args.subscribers, args.seed)}
+        elif transport == "prefork":
+            output["cold_start_seconds"] = {}
+            for workers in [int(n) for n in args.workers.split(",")]:
+                label = f"prefork-{workers}w"
+                process, port, cold_start = start_prefork(workers, args.threads)
+                output["cold_start_seconds"][workers] = round(cold_start, 3)
+                print(f"{label:<10} cold start {cold_start * 1000:.0f}ms", file=sys.stderr)
+                try:
+                    output["results"][label] = run_transport(
+                        label, data, args.clients, args.requests, args.seed, address=("127.0.0.1", port)
+                    )
+                    output["results"][label]["idle_subscribers"] = run_sse(
+                        data, args.subscribers, args.seed, address=("127.0.0.1", port), label=label
+                    )
+                finally:
+                    process.terminate()
+                    process.wait()
+        else:
+            output["results"][transport] = run_transport(transport, data, args.clients, args.requests, args.seed)
+
+    if args.replica_interval > 0:
+        output["replica"] = replica.replica.stats()
+        print(f"replica: {output['replica']}", file=sys.stderr)
+
+    conn = database.connect()
+    output["consistency"] = dict(find_inconsistencies(conn), occupancy_drift=len(occupancy.find_drift(conn)))
+    conn.close()
+    print(f"consistency: {output['consistency']}", file=sys.stderr)
+
+    json.dump(output, sys.stdout, indent=2)
+    print()
+
+    failed = any(r["errors"] for t in output["results"].values() for r in t.values())
+    return 1 if failed or any(output["consistency"].values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,496 @@
+"""Versioned schema migrations.
+
+The schema version lives in SQLite's `PRAGMA user_version`. `migrate()`
+applies every migration newer than that, in order, each in its own
+transaction, so an existing movie_booking.db is upgraded in place.
+
+To change the schema, append a new entry to MIGRATIONS - never edit one
+that has already shipped. A step is either a SQL string or a function that
+takes the connection, for data fixes that are easier in Python.
+"""
+import timeformat
+
+
+def _convert_start_times(conn):
+    rows = conn.execute("SELECT id, start_time FROM showtimes;").fetchall()
+    conn.executemany(
+        "UPDATE showtimes SET start_time = ? WHERE id = ?;",
+        [(timeformat.normalize_start_time(start_time), showtime_id) for showtime_id, start_time in rows],
+    )
+
+
+def _backfill_orders(conn):
+    """One order per (confirmation code, showtime) among existing bookings.
+
+    Old codes were random with no uniqueness check, so a code can be shared
+    by bookings on different showtimes; the later ones get the showtime id
+    appended to stay unique. Old bookings may have no customer name, which
+    orders requires, so those become "Guest" like new nameless bookings.
+    """
+    groups = conn.execute(
+        """
+        SELECT confirmation_code, showtime_id, COALESCE(MIN(customer_name), 'Guest'), MIN(booked_at)
+        FROM bookings
+        GROUP BY confirmation_code, showtime_id
+        ORDER BY MIN(id);
+        """
+    ).fetchall()
+    seen = set()
+    for code, showtime_id, customer_name, created_at in groups:
+        unique_code = code if code not in seen else f"{code}-{showtime_id}"
+        seen.add(unique_code)
+        order_id = conn.execute(
+            "INSERT INTO orders (code, showtime_id, customer_name, created_at) VALUES (?, ?, ?, ?);",
+            (unique_code, showtime_id, customer_name, created_at),
+        ).lastrowid
+        conn.execute(
+            "UPDATE bookings SET order_id = ? WHERE confirmation_code = ? AND showtime_id = ?;",
+            (order_id, code, showtime_id),
+        )
+
+
+MIGRATIONS = [
+    (
+        1,
+        "base tables",
+        [
+            """
+            CREATE TABLE IF NOT EXISTS movies (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                title TEXT NOT NULL,
+                description TEXT,
+                rating TEXT,
+                duration_minutes INTEGER
+            );
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS showtimes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                movie_id INTEGER NOT NULL,
+                start_time TEXT NOT NULL,
+                screen_name TEXT,
+                FOREIGN KEY (movie_id) REFERENCES movies(id)
+            );
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS seats (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                showtime_id INTEGER NOT NULL,
+                row_label TEXT NOT NULL,
+                seat_number INTEGER NOT NULL,
+                is_booked INTEGER DEFAULT 0,
+                FOREIGN KEY (showtime_id) REFERENCES showtimes(id)
+            );
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS bookings (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                showtime_id INTEGER NOT NULL,
+                seat_id INTEGER NOT NULL,
+                customer_name TEXT,
+                confirmation_code TEXT NOT NULL,
+                FOREIGN KEY (showtime_id) REFERENCES showtimes(id),
+                FOREIGN KEY (seat_id) REFERENCES seats(id)
+            );
+            """,
+        ],
+    ),
+    (
+        2,
+        "indexes for route lookups, seat and booking uniqueness",
+        [
+            # home: ORDER BY title
+            "CREATE INDEX IF NOT EXISTS idx_movies_title ON movies (title);",
+            # movie_detail: WHERE movie_id = ? ORDER BY start_time
+            "CREATE INDEX IF NOT EXISTS idx_showtimes_movie_start ON showtimes (movie_id, start_time);",
+            # analytics: every showtime in start_time order, covering the movie join
+            "CREATE INDEX IF NOT EXISTS idx_showtimes_start ON showtimes (start_time, movie_id);",
+            # seat map: WHERE showtime_id = ? ORDER BY row_label, seat_number,
+            # and no showtime can have the same seat twice
+            """
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_seats_showtime_position
+            ON seats (showtime_id, row_label, seat_number);
+            """,
+            # booking_success: WHERE confirmation_code = ?
+            "CREATE INDEX IF NOT EXISTS idx_bookings_confirmation ON bookings (confirmation_code);",
+            # a seat can only be held by one active booking
+            "ALTER TABLE bookings ADD COLUMN status TEXT NOT NULL DEFAULT 'active';",
+            """
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_bookings_active_seat
+            ON bookings (seat_id) WHERE status = 'active';
+            """,
+        ],
+    ),
+    (
+        3,
+        "sortable start_time, end_time from movie duration",
+        [
+            _convert_start_times,
+            "ALTER TABLE showtimes ADD COLUMN end_time TEXT;",
+            """
+            UPDATE showtimes
+            SET end_time = datetime(
+                start_time,
+                (SELECT '+' || duration_minutes || ' minutes' FROM movies WHERE movies.id = showtimes.movie_id)
+            );
+            """,
+            # new showtimes get their end_time filled in automatically
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_showtimes_end_time
+            AFTER INSERT ON showtimes
+            WHEN NEW.end_time IS NULL
+            BEGIN
+                UPDATE showtimes
+                SET end_time = datetime(
+                    NEW.start_time,
+                    (SELECT '+' || duration_minutes || ' minutes' FROM movies WHERE movies.id = NEW.movie_id)
+                )
+                WHERE id = NEW.id;
+            END;
+            """,
+        ],
+    ),
+    (
+        4,
+        "per-showtime occupancy counters kept in sync by triggers",
+        [
+            """
+            CREATE TABLE IF NOT EXISTS showtime_occupancy (
+                showtime_id INTEGER PRIMARY KEY,
+                total_seats INTEGER NOT NULL DEFAULT 0,
+                booked_seats INTEGER NOT NULL DEFAULT 0,
+                FOREIGN KEY (showtime_id) REFERENCES showtimes(id)
+            );
+            """,
+            """
+            INSERT OR REPLACE INTO showtime_occupancy (showtime_id, total_seats, booked_seats)
+            SELECT showtime_id, COUNT(*), SUM(COALESCE(is_booked, 0))
+            FROM seats
+            GROUP BY showtime_id;
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_seats_occupancy_insert
+            AFTER INSERT ON seats
+            BEGIN
+                INSERT INTO showtime_occupancy (showtime_id, total_seats, booked_seats)
+                VALUES (NEW.showtime_id, 1, COALESCE(NEW.is_booked, 0))
+                ON CONFLICT (showtime_id) DO UPDATE SET
+                    total_seats = total_seats + 1,
+                    booked_seats = booked_seats + excluded.booked_seats;
+            END;
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_seats_occupancy_booked
+            AFTER UPDATE OF is_booked ON seats
+            WHEN OLD.showtime_id = NEW.showtime_id
+            BEGIN
+                UPDATE showtime_occupancy
+                SET booked_seats = booked_seats + COALESCE(NEW.is_booked, 0) - COALESCE(OLD.is_booked, 0)
+                WHERE showtime_id = NEW.showtime_id;
+            END;
+            """,
+            # a seat moved to another showtime (not something the app does)
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_seats_occupancy_moved
+            AFTER UPDATE OF showtime_id ON seats
+            WHEN OLD.showtime_id != NEW.showtime_id
+            BEGIN
+                UPDATE showtime_occupancy
+                SET total_seats = total_seats - 1,
+                    booked_seats = booked_seats - COALESCE(OLD.is_booked, 0)
+                WHERE showtime_id = OLD.showtime_id;
+                INSERT INTO showtime_occupancy (showtime_id, total_seats, booked_seats)
+                VALUES (NEW.showtime_id, 1, COALESCE(NEW.is_booked, 0))
+                ON CONFLICT (showtime_id) DO UPDATE SET
+                    total_seats = total_seats + 1,
+                    booked_seats = booked_seats + excluded.booked_seats;
+            END;
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_seats_occupancy_delete
+            AFTER DELETE ON seats
+            BEGIN
+                UPDATE showtime_occupancy
+                SET total_seats = total_seats - 1,
+                    booked_seats = booked_seats - COALESCE(OLD.is_booked, 0)
+                WHERE showtime_id = OLD.showtime_id;
+            END;
+            """,
+        ],
+    ),
+    (
+        5,
+        "booking timestamps and hourly/daily sales rollups",
+        [
+            "ALTER TABLE bookings ADD COLUMN booked_at TEXT;",
+            "CREATE INDEX IF NOT EXISTS idx_bookings_booked_at ON bookings (booked_at);",
+            # seats = seats sold, orders = distinct confirmation codes
+            """
+            CREATE TABLE IF NOT EXISTS booking_rollups (
+                bucket_size TEXT NOT NULL,
+                bucket_start TEXT NOT NULL,
+                movie_id INTEGER NOT NULL,
+                screen_name TEXT NOT NULL,
+                seats INTEGER NOT NULL DEFAULT 0,
+                orders INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (bucket_size, bucket_start, movie_id, screen_name)
+            ) WITHOUT ROWID;
+            """,
+            # how far into bookings each background job has got
+            """
+            CREATE TABLE IF NOT EXISTS job_watermarks (
+                name TEXT PRIMARY KEY,
+                last_id INTEGER NOT NULL DEFAULT 0
+            );
+            """,
+        ],
+    ),
+    (
+        6,
+        "catalog version bumped on every movie/showtime change",
+        [
+            # one row; page caches key on `version`, Last-Modified uses updated_at (UTC)
+            """
+            CREATE TABLE IF NOT EXISTS catalog_version (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                version INTEGER NOT NULL DEFAULT 0,
+                updated_at TEXT NOT NULL
+            );
+            """,
+            "INSERT OR IGNORE INTO catalog_version (id, version, updated_at) VALUES (1, 0, datetime('now'));",
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_movies_catalog_insert
+            AFTER INSERT ON movies
+            BEGIN
+                UPDATE catalog_version SET version = version + 1, updated_at = datetime('now') WHERE id = 1;
+            END;
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_movies_catalog_update
+            AFTER UPDATE ON movies
+            BEGIN
+                UPDATE catalog_version SET version = version + 1, updated_at = datetime('now') WHERE id = 1;
+            END;
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_movies_catalog_delete
+            AFTER DELETE ON movies
+            BEGIN
+                UPDATE catalog_version SET version = version + 1, updated_at = datetime('now') WHERE id = 1;
+            END;
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_showtimes_catalog_insert
+            AFTER INSERT ON showtimes
+            BEGIN
+                UPDATE catalog_version SET version = version + 1, updated_at = datetime('now') WHERE id = 1;
+            END;
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_showtimes_catalog_update
+            AFTER UPDATE ON showtimes
+            BEGIN
+                UPDATE catalog_version SET version = version + 1, updated_at = datetime('now') WHERE id = 1;
+            END;
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_showtimes_catalog_delete
+            AFTER DELETE ON showtimes
+            BEGIN
+                UPDATE catalog_version SET version = version + 1, updated_at = datetime('now') WHERE id = 1;
+            END;
+            """,
+        ],
+    ),
+    (
+        7,
+        "poster image filename on movies",
+        [
+            # names are relative to static/images; build_assets.py makes the variants
+            "ALTER TABLE movies ADD COLUMN poster TEXT;",
+            # the demo catalog's posters used to be hardcoded in app.py by movie id
+            """
+            UPDATE movies SET poster = CASE title
+                WHEN 'Avatar' THEN 'avatar.jpg'
+                WHEN 'Twilight' THEN 'twilight.jpg'
+                WHEN 'Wicked: For Good' THEN 'wicked.jpg'
+                WHEN 'Jurassic World Rebirth' THEN 'jurassic.jpg'
+                WHEN 'Black Panther' THEN 'black-panther.jpg'
+            END
+            WHERE poster IS NULL;
+            """,
+        ],
+    ),
+    (
+        8,
+        "short-lived seat holds",
+        [
+            # at most one hold per seat; a hold past expires_at is ignored
+            # everywhere, holds.sweep_expired() just deletes them in batches
+            """
+            CREATE TABLE IF NOT EXISTS seat_holds (
+                seat_id INTEGER PRIMARY KEY REFERENCES seats(id),
+                showtime_id INTEGER NOT NULL REFERENCES showtimes(id),
+                holder TEXT NOT NULL,
+                expires_at TEXT NOT NULL
+            );
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_seat_holds_showtime ON seat_holds(showtime_id, expires_at);",
+            "CREATE INDEX IF NOT EXISTS idx_seat_holds_expires ON seat_holds(expires_at);",
+        ],
+    ),
+    (
+        9,
+        "seat change log for the live seat feed",
+        [
+            # written only by the triggers below; seat_events.py tails it by id
+            """
+            CREATE TABLE IF NOT EXISTS seat_changes (
+                id INTEGER PRIMARY KEY,
+                showtime_id INTEGER NOT NULL,
+                seat_id INTEGER NOT NULL,
+                state TEXT NOT NULL CHECK (state IN ('booked', 'held', 'free'))
+            );
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_seats_change_booked
+            AFTER UPDATE OF is_booked ON seats
+            WHEN OLD.is_booked != NEW.is_booked
+            BEGIN
+                INSERT INTO seat_changes (showtime_id, seat_id, state)
+                VALUES (NEW.showtime_id, NEW.id, CASE NEW.is_booked WHEN 1 THEN 'booked' ELSE 'free' END);
+            END;
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_seat_holds_change_insert
+            AFTER INSERT ON seat_holds
+            BEGIN
+                INSERT INTO seat_changes (showtime_id, seat_id, state) VALUES (NEW.showtime_id, NEW.seat_id, 'held');
+            END;
+            """,
+            # a hold dropped because the seat was just booked already logged 'booked'
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_seat_holds_change_delete
+            AFTER DELETE ON seat_holds
+            WHEN NOT (SELECT is_booked FROM seats WHERE id = OLD.seat_id)
+            BEGIN
+                INSERT INTO seat_changes (showtime_id, seat_id, state) VALUES (OLD.showtime_id, OLD.seat_id, 'free');
+            END;
+            """,
+            # keep only the most recent changes; readers only ever look back
+            # seconds. Trimming every 1000th insert keeps the per-row cost down.
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_seat_changes_trim
+            AFTER INSERT ON seat_changes
+            WHEN NEW.id % 1000 = 0
+            BEGIN
+                DELETE FROM seat_changes WHERE id <= NEW.id - 10000;
+            END;
+            """,
+        ],
+    ),
+    (
+        10,
+        "orders with unique confirmation codes",
+        [
+            """
+            CREATE TABLE IF NOT EXISTS orders (
+                id INTEGER PRIMARY KEY,
+                code TEXT NOT NULL UNIQUE,
+                showtime_id INTEGER NOT NULL REFERENCES showtimes(id),
+                customer_name TEXT NOT NULL,
+                created_at TEXT
+            );
+            """,
+            "ALTER TABLE bookings ADD COLUMN order_id INTEGER REFERENCES orders(id);",
+            _backfill_orders,
+            "CREATE INDEX IF NOT EXISTS idx_bookings_order ON bookings(order_id);",
+        ],
+    ),
+    (
+        11,
+        "drop the unused bookings.booked_at index",
+        [
+            # rollups range over bookings.id, so nothing reads it and every booking paid to write it
+            "DROP INDEX IF EXISTS idx_bookings_booked_at;",
+        ],
+    ),
+    (
+        12,
+        "seat hold placement time and per-holder lookups",
+        [
+            # renewals are capped at a fixed lifetime from placed_at (see holds.py)
+            "ALTER TABLE seat_holds ADD COLUMN placed_at TEXT;",
+            "UPDATE seat_holds SET placed_at = datetime('now');",
+            "CREATE INDEX IF NOT EXISTS idx_seat_holds_holder ON seat_holds(holder, expires_at);",
+        ],
+    ),
+    (
+        13,
+        "drop the unused bookings.confirmation_code index",
+        [
+            # lookups go through orders.code since migration 10
+            "DROP INDEX IF EXISTS idx_bookings_confirmation;",
+        ],
+    ),
+    (
+        14,
+        "seat hold times in UTC",
+        [
+            # holds were written in local time until now; placed_at restarts,
+            # which at most lets a hold that is live right now renew once more
+            "UPDATE seat_holds SET expires_at = datetime(expires_at, 'utc'), placed_at = datetime('now');",
+        ],
+    ),
+    (
+        15,
+        "log seat holds taken over in place",
+        [
+            # place_holds takes over an expired hold with an upsert, which
+            # updates the row instead of inserting one; extending a live hold
+            # of one's own isn't a change anyone else sees
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_seat_holds_change_update
+            AFTER UPDATE OF holder, expires_at ON seat_holds
+            WHEN OLD.holder IS NOT NEW.holder OR OLD.expires_at <= datetime('now')
+            BEGIN
+                INSERT INTO seat_changes (showtime_id, seat_id, state) VALUES (NEW.showtime_id, NEW.seat_id, 'held');
+            END;
+            """,
+        ],
+    ),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn):
+    return conn.execute("PRAGMA user_version;").fetchone()[0]
+
+
+def migrate(conn):
+    """Bring the database up to LATEST_VERSION. Returns the versions applied."""
+    applied = []
+    for version, name, statements in MIGRATIONS:
+        if current_version(conn) >= version:
+            continue
+
+        # IMMEDIATE so two processes starting at once can't both run it;
+        # re-check the version once we hold the lock.
+        conn.execute("BEGIN IMMEDIATE;")
+        try:
+            if current_version(conn) >= version:
+                conn.rollback()
+                continue
+            for statement in statements:
+                if callable(statement):
+                    statement(conn)
+                else:
+                    conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {version};")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append((version, name))
+    return applied
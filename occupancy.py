@@ -0,0 +1,70 @@
+"""Consistency check for the showtime_occupancy counters.
+
+Triggers on `seats` keep showtime_occupancy in step with every seat insert,
+booking and delete. This recounts from the seats table and reports any
+showtime whose counters have drifted:
+
+    python occupancy.py           # report drift, exit non-zero if any
+    python occupancy.py --repair  # also rebuild the counters
+"""
+import sys
+
+from database import get_connection
+
+RECOUNT_SQL = """
+    SELECT showtime_id, COUNT(*) AS total_seats, SUM(COALESCE(is_booked, 0)) AS booked_seats
+    FROM seats
+    GROUP BY showtime_id
+"""
+
+
+def find_drift(conn):
+    """Return [(showtime_id, stored, actual), ...] where stored != actual.
+
+    Both are (total_seats, booked_seats) tuples; a missing row counts as (0, 0).
+    """
+    cur = conn.cursor()
+    cur.execute(f"{RECOUNT_SQL};")
+    actual = {r["showtime_id"]: (r["total_seats"], r["booked_seats"]) for r in cur.fetchall()}
+    cur.execute("SELECT showtime_id, total_seats, booked_seats FROM showtime_occupancy;")
+    stored = {r["showtime_id"]: (r["total_seats"], r["booked_seats"]) for r in cur.fetchall()}
+
+    drift = []
+    for showtime_id in sorted(actual.keys() | stored.keys()):
+        have = stored.get(showtime_id, (0, 0))
+        want = actual.get(showtime_id, (0, 0))
+        if have != want:
+            drift.append((showtime_id, have, want))
+    return drift
+
+
+def rebuild(conn):
+    """Recompute every counter from the seats table in one transaction."""
+    conn.execute("BEGIN IMMEDIATE;")
+    try:
+        conn.execute("DELETE FROM showtime_occupancy;")
+        conn.execute(
+            f"""
+            INSERT INTO showtime_occupancy (showtime_id, total_seats, booked_seats)
+            {RECOUNT_SQL};
+            """
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+if __name__ == "__main__":
+    conn = get_connection()
+    drift = find_drift(conn)
+    for showtime_id, stored, actual in drift:
+        print(f"showtime {showtime_id}: stored total/booked {stored}, actual {actual}")
+
+    if not drift:
+        print("Occupancy counters are consistent.")
+    elif "--repair" in sys.argv:
+        rebuild(conn)
+        print(f"Rebuilt counters; {len(find_drift(conn))} showtimes still drifting.")
+    conn.close()
+    sys.exit(1 if drift and "--repair" not in sys.argv else 0)
@@ -0,0 +1,146 @@
+"""Rendered-page and fragment caches.
+
+The home and movie pages only change when the catalog (movies and
+showtimes) does. Migration 6 keeps a one-row `catalog_version` table that
+triggers bump on every such write, so `cached_page` keys each rendered body
+on (endpoint, view args, query args, catalog version). A catalog write makes
+every older entry unreachable and the LRU pushes them out; a hit costs one
+primary-key lookup instead of the page's queries and template render.
+
+Cached responses carry a strong ETag (a hash of the body) and Last-Modified
+(when the catalog last changed), so browsers revalidate with If-None-Match /
+If-Modified-Since and get an empty 304 back.
+
+Cached views read from the replica snapshot (see replica.py), and so does
+the version check, so a page is never cached under a version newer than
+the data it was rendered from.
+
+`fragments` holds pieces of pages that change more often than the catalog,
+such as the seat grid, keyed by whatever the fragment is rendered from.
+"""
+import functools
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import timezone
+
+from flask import Response, current_app, request, session
+
+from replica import get_read_connection
+from timeformat import from_storage
+
+CachedPage = namedtuple("CachedPage", ["body", "etag", "last_modified", "mimetype"])
+
+
+class LRUCache:
+    """Thread-safe LRU bounded by entry count and by total size in bytes."""
+
+    def __init__(self, max_entries=512, max_bytes=16 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            self._entries[key] = (value, size)
+            self.size += size
+            while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+                self.evictions += 1
+
+    def get_or_render(self, key, render):
+        """Return the cached string for `key`, calling `render()` on a miss."""
+        value = self.get(key)
+        if value is None:
+            value = render()
+            self.put(key, value, len(value))
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.size,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+pages = LRUCache(max_entries=512, max_bytes=16 * 1024 * 1024)
+fragments = LRUCache(max_entries=1024, max_bytes=16 * 1024 * 1024)
+
+
+def catalog_state(conn):
+    """(version, last_modified) of the movie/showtime catalog."""
+    row = conn.execute("SELECT version, updated_at FROM catalog_version WHERE id = 1;").fetchone()
+    return row[0], from_storage(row[1]).replace(tzinfo=timezone.utc)
+
+
+def _respond(page):
+    response = Response(page.body, mimetype=page.mimetype)
+    response.set_etag(page.etag)
+    response.last_modified = page.last_modified
+    response.cache_control.no_cache = True  # always revalidate; a match costs a 304
+    return response.make_conditional(request)
+
+
+def cached_page(view):
+    """Cache a GET view's 200 responses until the catalog changes.
+
+    Requests with flash messages waiting go straight to the view, so one
+    visitor's message is never cached and shown to everyone else.
+    """
+
+    @functools.wraps(view)
+    def wrapper(**view_args):
+        if request.method != "GET" or session.get("_flashes"):
+            return view(**view_args)
+
+        # same connection the view reads from, so the version matches the content
+        version, last_modified = catalog_state(get_read_connection())
+        key = (
+            request.endpoint,
+            tuple(sorted(view_args.items())),
+            tuple(sorted(request.args.items(multi=True))),
+            version,
+        )
+        page = pages.get(key)
+        if page is None:
+            response = current_app.make_response(view(**view_args))
+            if response.status_code != 200 or response.is_streamed:
+                return response
+            body = response.get_data()
+            page = CachedPage(body, hashlib.sha256(body).hexdigest()[:32], last_modified, response.mimetype)
+            pages.put(key, page, len(body))
+        return _respond(page)
+
+    return wrapper
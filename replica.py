@@ -0,0 +1,194 @@
+"""Read-only snapshot of the database for catalog and report pages.
+
+A background thread copies the live database into REPLICA_PATH with the
+sqlite3 backup API every REFRESH_INTERVAL seconds. Each copy is written to
+a temporary file and renamed into place, so a refresh never touches a file
+anyone is reading: connections opened on the previous copy keep reading it
+until they are released, new ones open the new copy. Copies are opened with
+`mode=ro&immutable=1`, so SQLite takes no locks on them at all.
+
+In a multi-process server one process refreshes and the others follow():
+they watch the file and switch to each new copy as it appears.
+
+home, movie_detail and analytics read through get_read_connection().
+Anything that books seats or looks up a booking stays on the primary via
+database.get_connection(). If the snapshot is older than MAX_STALENESS
+(the refresher is stuck or failing) or was never started, reads fall back
+to the primary as well.
+
+    MOVIE_BOOKING_REPLICA_INTERVAL=5        seconds between refreshes
+    MOVIE_BOOKING_REPLICA_MAX_STALENESS=30  oldest snapshot we'll serve
+"""
+import os
+import sqlite3
+import threading
+import time
+
+from flask import current_app, g, has_app_context
+
+import database
+import jobs
+
+REPLICA_PATH = os.environ.get("MOVIE_BOOKING_REPLICA", database.DB_NAME + ".replica")
+REFRESH_INTERVAL = float(os.environ.get("MOVIE_BOOKING_REPLICA_INTERVAL", "5"))
+MAX_STALENESS = float(os.environ.get("MOVIE_BOOKING_REPLICA_MAX_STALENESS", "30"))
+
+# the primary's tuning minus everything about writing and locking
+READ_PRAGMAS = (
+    "PRAGMA cache_size = -16000;",
+    "PRAGMA mmap_size = 268435456;",
+    "PRAGMA temp_store = MEMORY;",
+)
+
+
+def open_readonly(path):
+    conn = sqlite3.connect(
+        f"file:{path}?mode=ro&immutable=1",
+        uri=True,
+        check_same_thread=False,
+        cached_statements=256,
+    )
+    conn.row_factory = sqlite3.Row
+    for pragma in READ_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+class Snapshot:
+    """One copy of the database and a pool of read-only connections to it."""
+
+    def __init__(self, path, taken_at):
+        self.taken_at = taken_at
+        self.retired = False
+        self.pool = database.ConnectionPool(factory=lambda: open_readonly(path))
+        # a release racing retire() could otherwise put a connection back
+        # after close_all() drained the pool, leaving it (and the replaced
+        # file it keeps open) around for good
+        self._lock = threading.Lock()
+
+    def release(self, conn):
+        with self._lock:
+            if not self.retired:
+                self.pool.release(conn)
+                return
+        conn.close()
+
+    def retire(self):
+        with self._lock:
+            self.retired = True
+            self.pool.close_all()
+
+
+class Replica:
+    def __init__(self, path=REPLICA_PATH, interval=REFRESH_INTERVAL, max_staleness=MAX_STALENESS):
+        self.path = path
+        self.interval = interval
+        self.max_staleness = max_staleness
+        self.refreshes = 0
+        self.last_refresh_seconds = None
+        self._current = None
+        self._seen = None  # (inode, mtime) of the file follow() last switched to
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Take a new snapshot of the primary and switch readers over to it."""
+        started = time.perf_counter()
+        taken_at = time.time()
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        source = database.connect()
+        target = sqlite3.connect(tmp)
+        try:
+            # one step: a WAL read transaction, so it never blocks the writer
+            source.backup(target)
+            # a plain rollback-journal file needs no -wal/-shm next to it
+            target.execute("PRAGMA journal_mode = DELETE;")
+        finally:
+            target.close()
+            source.close()
+        os.replace(tmp, self.path)
+
+        self.last_refresh_seconds = time.perf_counter() - started
+        return self._switch(taken_at)
+
+    def _switch(self, taken_at):
+        snapshot = Snapshot(self.path, taken_at)
+        with self._lock:
+            previous, self._current = self._current, snapshot
+            self.refreshes += 1
+        if previous is not None:
+            previous.retire()
+        return snapshot
+
+    def current(self):
+        """The snapshot to read from, or None if there is no fresh enough one."""
+        snapshot = self._current
+        if snapshot is None or time.time() - snapshot.taken_at > self.max_staleness:
+            return None
+        return snapshot
+
+    def check_file(self):
+        """Switch to the copy on disk if another process has refreshed it."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return  # nobody has refreshed yet
+        if (st.st_ino, st.st_mtime_ns) != self._seen:
+            self._seen = (st.st_ino, st.st_mtime_ns)
+            # renamed into place right after the backup, so mtime is close to its age
+            self._switch(st.st_mtime)
+
+    def follow(self):
+        """Pick up copies another process refreshes (see jobs.every).
+
+        Reads fall back to the primary once the copy goes stale.
+        """
+        return jobs.every("replica-follow", min(1.0, self.interval), self.check_file, immediately=True)
+
+    def start_background(self):
+        """Refresh now and then every `interval` seconds (see jobs.every).
+
+        A failed refresh is retried next tick; reads fall back once stale.
+        """
+        return jobs.every("replica-refresh", self.interval, self.refresh, immediately=True)
+
+    def stats(self):
+        snapshot = self._current
+        return {
+            "refreshes": self.refreshes,
+            "age_seconds": round(time.time() - snapshot.taken_at, 3) if snapshot else None,
+            "last_refresh_seconds": self.last_refresh_seconds,
+        }
+
+
+replica = Replica()
+
+
+def get_read_connection():
+    """A connection for read-only pages: the snapshot if fresh, else the primary.
+
+    Like database.get_connection(), it is kept for the rest of the request
+    and released on teardown, so every query in a request sees the same copy.
+    """
+    if not has_app_context():
+        return database.connect()
+    if "read_db" not in g:
+        snapshot = replica.current()
+        if snapshot is None:
+            g.read_db = database.get_connection()
+        else:
+            wrap = current_app.extensions.get("db_connection_wrapper")
+            conn = wrap(snapshot.pool.acquire) if wrap is not None else snapshot.pool.acquire()
+            g.read_db = conn
+            g.read_snapshot = snapshot
+    return g.read_db
+
+
+def close_read_connection(exception=None):
+    conn = g.pop("read_db", None)
+    snapshot = g.pop("read_snapshot", None)
+    if conn is not None and snapshot is not None:
+        snapshot.release(getattr(conn, "raw", conn))
+
+
+def init_app(app):
+    app.teardown_appcontext(close_read_connection)
@@ -0,0 +1,146 @@
+"""Seat reservation engine.
+
+All seats in a booking are claimed in one short write transaction, so two
+buyers racing for the same seat can never both get it. The same transaction
+creates the order they belong to, under a fresh confirmation code.
+"""
+import secrets
+from datetime import datetime
+
+import timeformat
+
+# no 0/O or 1/I, so codes survive being read out over the phone
+CODE_ALPHABET = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"
+CODE_LENGTH = 10  # 50 random bits
+CODE_ATTEMPTS = 5
+
+
+class SeatsUnavailable(Exception):
+    """Raised when some requested seats could not be claimed.
+
+    `seat_ids` holds the ones that lost the race (already booked, or not
+    part of the showtime). Nothing is booked when this is raised.
+    """
+
+    def __init__(self, seat_ids):
+        super().__init__(f"seats unavailable: {sorted(seat_ids)}")
+        self.seat_ids = set(seat_ids)
+
+
+def _parse_seat_ids(seat_ids):
+    parsed, invalid = set(), set()
+    for seat_id in seat_ids:
+        try:
+            parsed.add(int(seat_id))
+        except (TypeError, ValueError):
+            invalid.add(seat_id)
+    return parsed, invalid
+
+
+def new_confirmation_code():
+    return "".join(secrets.choice(CODE_ALPHABET) for _ in range(CODE_LENGTH))
+
+
+def _create_order(conn, showtime_id, customer_name, created_at):
+    """Insert an order under a code nobody has; returns (order_id, code)."""
+    for _ in range(CODE_ATTEMPTS):
+        code = new_confirmation_code()
+        row = conn.execute(
+            """
+            INSERT INTO orders (code, showtime_id, customer_name, created_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT (code) DO NOTHING
+            RETURNING id;
+            """,
+            (code, showtime_id, customer_name, created_at),
+        ).fetchone()
+        if row is not None:
+            return row[0], code
+    raise RuntimeError(f"no unique confirmation code after {CODE_ATTEMPTS} attempts")
+
+
+def reserve_seats(conn, showtime_id, seat_ids, customer_name, holder=None):
+    """Book every seat in `seat_ids` for `showtime_id`, or none of them.
+
+    Seats with a live hold (see holds.py) can only be booked by `holder`;
+    their holds are dropped once the booking commits. Returns
+    (confirmation_code, booked seat ids). Raises SeatsUnavailable listing
+    the seats that were taken, held by someone else or don't belong to the
+    showtime.
+    """
+    requested, invalid = _parse_seat_ids(seat_ids)
+    if invalid:
+        raise SeatsUnavailable(invalid)
+    if not requested:
+        return None, []
+
+    placeholders = ",".join("?" for _ in requested)
+    now = timeformat.to_storage(datetime.now())
+    holds_now = timeformat.to_storage(timeformat.utc_now())  # seat holds are in UTC
+
+    # IMMEDIATE takes the write lock up front, so the claim below can't be
+    # interleaved with another booking. busy_timeout makes us queue for it.
+    conn.execute("BEGIN IMMEDIATE;")
+    try:
+        claimed = conn.execute(
+            f"""
+            UPDATE seats SET is_booked = 1
+            WHERE showtime_id = ? AND is_booked = 0 AND id IN ({placeholders})
+              AND NOT EXISTS (
+                  SELECT 1 FROM seat_holds h
+                  WHERE h.seat_id = seats.id AND h.expires_at > ? AND h.holder IS NOT ?
+              )
+            RETURNING id;
+            """,
+            (showtime_id, *requested, holds_now, holder),
+        ).fetchall()
+        claimed = {row[0] for row in claimed}
+
+        lost = requested - claimed
+        if lost:
+            conn.rollback()
+            raise SeatsUnavailable(lost)
+
+        order_id, confirmation_code = _create_order(conn, showtime_id, customer_name, now)
+        conn.executemany(
+            """
+            INSERT INTO bookings (showtime_id, seat_id, customer_name, confirmation_code, booked_at, order_id)
+            VALUES (?, ?, ?, ?, ?, ?);
+            """,
+            [
+                (showtime_id, seat_id, customer_name, confirmation_code, now, order_id)
+                for seat_id in sorted(claimed)
+            ],
+        )
+        conn.execute(f"DELETE FROM seat_holds WHERE seat_id IN ({placeholders});", tuple(requested))
+        conn.commit()
+    except SeatsUnavailable:
+        raise
+    except Exception:
+        conn.rollback()
+        raise
+
+    return confirmation_code, sorted(claimed)
+
+
+def find_inconsistencies(conn):
+    """Count violations of the booking invariants; all zeros means healthy.
+
+    `double_booked` is seats with more than one booking, `mismatched` is
+    seats whose is_booked flag disagrees with their active bookings.
+    """
+    double_booked = conn.execute(
+        """
+        SELECT COUNT(*) FROM (
+            SELECT seat_id FROM bookings GROUP BY seat_id HAVING COUNT(*) > 1
+        );
+        """
+    ).fetchone()[0]
+    mismatched = conn.execute(
+        """
+        SELECT COUNT(*) FROM seats s
+        WHERE s.is_booked != (
+            SELECT COUNT(*) FROM bookings b WHERE b.seat_id = s.id AND b.status = 'active'
+        );
+        """
+    ).fetchone()[0]
+    return {"double_booked": double_booked, "mismatched": mismatched}
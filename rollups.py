@@ -0,0 +1,115 @@
+"""Hourly and daily sales rollups.
+
+A background job folds new bookings into `booking_rollups`, one row per
+(bucket, movie, screen), so /api/analytics never reads the raw bookings
+table. It only looks at bookings newer than its watermark, so each run
+costs as much as the bookings made since the last one.
+
+Bucket times use the same local "YYYY-MM-DD HH:MM:SS" format as the rest
+of the schema (see timeformat.py).
+
+    python rollups.py             # roll up once and exit (e.g. from cron)
+    python rollups.py --forever   # keep rolling up every ROLLUP_INTERVAL
+"""
+import os
+
+import jobs
+
+ROLLUP_INTERVAL = float(os.environ.get("MOVIE_BOOKING_ROLLUP_INTERVAL", "60"))
+WATERMARK = "booking_rollups"
+
+BUCKETS = {
+    "hour": "strftime('%Y-%m-%d %H:00:00', b.booked_at)",
+    "day": "date(b.booked_at) || ' 00:00:00'",
+}
+
+
+def run_rollup(conn):
+    """Fold every booking past the watermark into the rollups.
+
+    Returns how many booking ids were folded in. Bookings are only ever
+    committed whole (see reservations.py) and ids grow in commit order, so
+    an order never straddles two runs and COUNT(DISTINCT order_id) adds up.
+    """
+    conn.execute("BEGIN IMMEDIATE;")
+    try:
+        row = conn.execute("SELECT last_id FROM job_watermarks WHERE name = ?;", (WATERMARK,)).fetchone()
+        last_id = row[0] if row else 0
+        high_id = conn.execute(
+            "SELECT COALESCE(MAX(id), 0) FROM bookings WHERE id > ?;", (last_id,)
+        ).fetchone()[0]
+        if high_id == 0:
+            conn.rollback()
+            return 0
+
+        for bucket_size, bucket_expr in BUCKETS.items():
+            conn.execute(
+                f"""
+                INSERT INTO booking_rollups (bucket_size, bucket_start, movie_id, screen_name, seats, orders)
+                SELECT ?, {bucket_expr}, st.movie_id, COALESCE(st.screen_name, ''),
+                       COUNT(*), COUNT(DISTINCT b.order_id)
+                FROM bookings b
+                JOIN showtimes st ON st.id = b.showtime_id
+                WHERE b.id > ? AND b.id <= ? AND b.booked_at IS NOT NULL
+                GROUP BY 2, 3, 4
+                ON CONFLICT (bucket_size, bucket_start, movie_id, screen_name) DO UPDATE SET
+                    seats = seats + excluded.seats,
+                    orders = orders + excluded.orders;
+                """,
+                (bucket_size, last_id, high_id),
+            )
+
+        conn.execute(
+            """
+            INSERT INTO job_watermarks (name, last_id) VALUES (?, ?)
+            ON CONFLICT (name) DO UPDATE SET last_id = excluded.last_id;
+            """,
+            (WATERMARK, high_id),
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return high_id - last_id
+
+
+def query_rollups(conn, bucket_size, start=None, end=None, movie_id=None, screen_name=None):
+    """Return a cursor over rollup rows in [start, end), oldest first."""
+    clauses = ["r.bucket_size = ?"]
+    params = [bucket_size]
+    if start is not None:
+        clauses.append("r.bucket_start >= ?")
+        params.append(start)
+    if end is not None:
+        clauses.append("r.bucket_start < ?")
+        params.append(end)
+    if movie_id is not None:
+        clauses.append("r.movie_id = ?")
+        params.append(movie_id)
+    if screen_name is not None:
+        clauses.append("r.screen_name = ?")
+        params.append(screen_name)
+
+    return conn.execute(
+        f"""
+        SELECT r.bucket_start, r.movie_id, m.title, r.screen_name, r.seats, r.orders
+        FROM booking_rollups r
+        JOIN movies m ON m.id = r.movie_id
+        WHERE {" AND ".join(clauses)}
+        ORDER BY r.bucket_start, r.movie_id, r.screen_name;
+        """,
+        params,
+    )
+
+
+def start_background(interval=ROLLUP_INTERVAL):
+    """Run the rollup every `interval` seconds (see jobs.every).
+
+    Safe to start in several processes: runs are serialized by the write
+    lock and the watermark.
+    """
+    return jobs.every("booking-rollups", interval, run_rollup, with_connection=True)
+
+
+if __name__ == "__main__":
+    jobs.run_cli(run_rollup, ROLLUP_INTERVAL, "Rolled up {} bookings.")
@@ -0,0 +1,273 @@
+"""In-memory seat map cache for /showtime/<id>/seats.
+
+Each cached showtime keeps its layout (rows, seat numbers, seat ids, plus
+the showtime and movie header) as an immutable `SeatLayout`, rebuilt from
+the rows on every reload so catalog edits show up, which seats are booked
+as a bitset with one bit per seat, and the seat holds (holds.py) as
+{seat_id: (holder, expires_at)}. The booking and hold paths patch an entry
+after they commit, so a cache hit renders the page without touching SQLite.
+A hold that has expired is ignored when the map is read, like everywhere
+else.
+
+The cache is per process. Changes made by other processes come in through
+seat_events' feed (apply_changes); entries also expire after `max_age`
+seconds, which bounds how stale a map can get if the feed falls behind.
+"""
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import timeformat
+
+Seat = namedtuple("Seat", ["id", "seat_number", "is_booked"])
+
+
+class SeatLayout:
+    """The parts of a seat map that only change when the catalog does."""
+
+    __slots__ = ("showtime", "movie", "row_labels", "row_seats", "positions")
+
+    def __init__(self, showtime, movie, seats):
+        self.showtime = dict(showtime)
+        self.movie = dict(movie) if movie is not None else None
+
+        row_labels, row_seats = [], []
+        for seat in seats:  # already ordered by row_label, seat_number
+            if not row_labels or row_labels[-1] != seat["row_label"]:
+                row_labels.append(seat["row_label"])
+                row_seats.append([])
+            row_seats[-1].append((seat["id"], seat["seat_number"]))
+
+        self.row_labels = tuple(row_labels)
+        self.row_seats = tuple(tuple(row) for row in row_seats)
+        # seat id -> bit position
+        self.positions = {}
+        for row in self.row_seats:
+            for seat_id, _ in row:
+                self.positions[seat_id] = len(self.positions)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def same_as(self, other):
+        return (
+            self.row_seats == other.row_seats
+            and self.row_labels == other.row_labels
+            and self.showtime == other.showtime
+            and self.movie == other.movie
+        )
+
+
+def _set_bit(bits, position):
+    bits[position >> 3] |= 1 << (position & 7)
+
+
+def _get_bit(bits, position):
+    return bits[position >> 3] >> (position & 7) & 1
+
+
+def build_bitmap(layout, seats):
+    bits = bytearray((len(layout) + 7) // 8)
+    for seat in seats:
+        if seat["is_booked"]:
+            _set_bit(bits, layout.positions[seat["id"]])
+    return bits
+
+
+class SeatMap:
+    """A read-only view of one showtime's seats at a point in time."""
+
+    __slots__ = ("layout", "bits", "holds")
+
+    def __init__(self, layout, bits, holds):
+        self.layout = layout
+        self.bits = bytes(bits)
+        self.holds = holds  # never mutated; patches replace the entry's dict
+
+    @property
+    def showtime(self):
+        return self.layout.showtime
+
+    @property
+    def movie(self):
+        return self.layout.movie
+
+    def is_booked(self, seat_id):
+        return bool(_get_bit(self.bits, self.layout.positions[seat_id]))
+
+    def live_holds(self):
+        """{seat_id: holder} for the holds that haven't expired yet."""
+        now = timeformat.to_storage(timeformat.utc_now())
+        return {seat_id: holder for seat_id, (holder, expires_at) in self.holds.items() if expires_at > now}
+
+    def rows(self):
+        """{row_label: [Seat, ...]} in display order, for seats.html."""
+        rows = {}
+        position = 0
+        for row_label, row in zip(self.layout.row_labels, self.layout.row_seats):
+            seats = []
+            for seat_id, seat_number in row:
+                seats.append(Seat(seat_id, seat_number, _get_bit(self.bits, position)))
+                position += 1
+            rows[row_label] = seats
+        return rows
+
+
+class _Entry:
+    __slots__ = ("layout", "bits", "holds", "loaded_at")
+
+    def __init__(self, layout, bits, holds, loaded_at):
+        self.layout = layout
+        self.bits = bits
+        self.holds = holds
+        self.loaded_at = loaded_at
+
+
+class SeatMapCache:
+    """LRU cache of seat maps keyed by showtime id."""
+
+    def __init__(self, capacity=256, max_age=2.0):
+        self.capacity = capacity
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        # bumped on every change to a showtime, so a load that raced with a
+        # booking doesn't store a map that is already out of date
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, showtime_id, loader):
+        """Return a SeatMap, calling `loader(showtime_id)` on a miss.
+
+        `loader` returns (showtime_row, movie_row, seat_rows, holds), holds
+        being {seat_id: (holder, expires_at)}, or None when the showtime
+        doesn't exist, in which case get() returns None too.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(showtime_id)
+            if entry is not None and now - entry.loaded_at < self.max_age:
+                self._entries.move_to_end(showtime_id)
+                self.hits += 1
+                return SeatMap(entry.layout, entry.bits, entry.holds)
+            self.misses += 1
+            generation = self._generations.get(showtime_id, 0)
+
+        loaded = loader(showtime_id)
+        if loaded is None:
+            return None
+        showtime, movie, seats, holds = loaded
+        layout = SeatLayout(showtime, movie, seats)
+        if entry is not None and entry.layout.same_as(layout):
+            # keep the old object so fragments keyed on it stay hits
+            layout = entry.layout
+        bits = build_bitmap(layout, seats)
+        seat_map = SeatMap(layout, bits, holds)
+
+        with self._lock:
+            if self._generations.get(showtime_id, 0) == generation:
+                self._entries[showtime_id] = _Entry(layout, bits, holds, now)
+                self._entries.move_to_end(showtime_id)
+                while len(self._entries) > self.capacity:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return seat_map
+
+    def _patch(self, showtime_id, seat_ids):
+        """The entry to patch for a change to `seat_ids`, or None. Call with the lock held."""
+        self._generations[showtime_id] = self._generations.get(showtime_id, 0) + 1
+        entry = self._entries.get(showtime_id)
+        if entry is None:
+            return None
+        if any(seat_id not in entry.layout.positions for seat_id in seat_ids):
+            # the layout doesn't know this seat; reload next time
+            del self._entries[showtime_id]
+            return None
+        return entry
+
+    def mark_booked(self, showtime_id, seat_ids):
+        """Patch a cached map after seats were booked and committed."""
+        with self._lock:
+            entry = self._patch(showtime_id, seat_ids)
+            if entry is None:
+                return
+            for seat_id in seat_ids:
+                _set_bit(entry.bits, entry.layout.positions[seat_id])
+            # booking drops the seats' holds
+            entry.holds = {seat_id: hold for seat_id, hold in entry.holds.items() if seat_id not in seat_ids}
+
+    def mark_held(self, showtime_id, seat_ids, holder, expires_at):
+        """Patch a cached map after holds were placed or extended and committed."""
+        with self._lock:
+            entry = self._patch(showtime_id, seat_ids)
+            if entry is None:
+                return
+            entry.holds = {**entry.holds, **{seat_id: (holder, expires_at) for seat_id in seat_ids}}
+
+    def mark_released(self, showtime_id, seat_ids):
+        """Patch a cached map after holds were released and committed."""
+        with self._lock:
+            entry = self._patch(showtime_id, seat_ids)
+            if entry is None:
+                return
+            entry.holds = {seat_id: hold for seat_id, hold in entry.holds.items() if seat_id not in seat_ids}
+
+    def apply_changes(self, showtime_id, states):
+        """Patch a cached map with seat changes from seat_events' feed.
+
+        `states` is {seat_id: "booked" | "held" | "free"}, from any process.
+        Bookings are set directly. A change to a hold doesn't say who holds
+        the seat, or whether it is older than a patch made here, so unless
+        the map already shows it the entry is dropped and reloaded.
+        """
+        now = timeformat.to_storage(timeformat.utc_now())
+        with self._lock:
+            entry = self._entries.get(showtime_id)
+            if entry is None:
+                return
+            booked = []
+            for seat_id, state in states.items():
+                position = entry.layout.positions.get(seat_id)
+                if position is None:
+                    break
+                hold = entry.holds.get(seat_id)
+                held = hold is not None and hold[1] > now
+                if state == "booked":
+                    booked.append(seat_id)
+                elif _get_bit(entry.bits, position) or held != (state == "held"):
+                    break
+            else:
+                if booked:
+                    self._generations[showtime_id] = self._generations.get(showtime_id, 0) + 1
+                    for seat_id in booked:
+                        _set_bit(entry.bits, entry.layout.positions[seat_id])
+                    entry.holds = {seat_id: hold for seat_id, hold in entry.holds.items() if seat_id not in booked}
+                return
+            self._generations[showtime_id] = self._generations.get(showtime_id, 0) + 1
+            del self._entries[showtime_id]
+
+    def invalidate(self, showtime_id):
+        with self._lock:
+            self._generations[showtime_id] = self._generations.get(showtime_id, 0) + 1
+            self._entries.pop(showtime_id, None)
+
+    def clear(self):
+        with self._lock:
+            for showtime_id in self._entries:
+                self._generations[showtime_id] = self._generations.get(showtime_id, 0) + 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "capacity": self.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+seat_maps = SeatMapCache()
@@ -0,0 +1,225 @@
+"""Live seat availability for /showtime/<id>/events (Server-Sent Events).
+
+Every change to a seat's state lands in the `seat_changes` table, written
+by triggers on seats and seat_holds (migrations 9 and 15), so bookings and
+holds made by any process show up. A hold that expires shows up as free
+when the hold sweeper (holds.py) deletes it, within a second. One thread per process tails that table and
+fans new changes out to per-showtime channels; each open event stream just
+waits on its channel. However many viewers are connected, the database sees
+one small indexed read per POLL_INTERVAL.
+
+A message carries every change one poll found for that showtime:
+
+    id: 1234
+    event: seats
+    data: {"booked": [17, 18], "held": [20], "free": [5]}
+
+The id is the last seat_changes id in the message. A browser that
+reconnects sends it back as Last-Event-ID and gets whatever it missed, or
+a `reload` event if that has already dropped out of the channel's buffer.
+A channel nobody has watched for CHANNEL_IDLE seconds is dropped, so
+showtimes long gone don't keep their buffers forever. Listeners added with
+add_listener() get every change, watched or not; the seat map cache
+(seat_cache.py) keeps up with other processes that way.
+
+Each open stream ties up a server thread for as long as the viewer stays,
+so a process serves at most MAX_STREAMS at once; the route turns away the
+rest with a 503 instead of letting them crowd out ordinary requests. A
+viewer that has gone is noticed at the next write, at most HEARTBEAT later,
+which is when its slot frees up.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+from database import connect
+
+POLL_INTERVAL = float(os.environ.get("MOVIE_BOOKING_SEAT_FEED_POLL", "0.25"))
+MAX_STREAMS = int(os.environ.get("MOVIE_BOOKING_MAX_STREAMS", "2000"))  # per process
+HEARTBEAT = 15.0  # seconds between keep-alive comments on an idle stream
+BUFFER = 256  # messages kept per showtime for reconnecting clients
+POLL_BATCH = 5000
+CHANNEL_IDLE = 300.0  # seconds a channel with no viewers is kept
+
+
+class Channel:
+    """Recent messages for one showtime, and the viewers waiting on them."""
+
+    __slots__ = ("messages", "floor", "last_id", "condition", "viewers", "idle_since")
+
+    def __init__(self, last_id):
+        self.messages = deque(maxlen=BUFFER)  # (last change id, encoded message)
+        # everything after `floor` is still in `messages`
+        self.floor = last_id
+        self.last_id = last_id
+        self.condition = threading.Condition()
+        # both guarded by SeatFeed._lock
+        self.viewers = 0
+        self.idle_since = time.monotonic()
+
+    def publish(self, last_id, message):
+        with self.condition:
+            if len(self.messages) == BUFFER:
+                self.floor = self.messages[0][0]
+            self.messages.append((last_id, message))
+            self.last_id = last_id
+            self.condition.notify_all()
+
+    def since(self, after_id):
+        """(messages newer than `after_id`, whether some are no longer buffered)."""
+        if after_id < self.floor:
+            return [], True
+        return [message for last_id, message in self.messages if last_id > after_id], False
+
+
+def encode(last_id, changes):
+    """One SSE message for a {state: [seat ids]} diff."""
+    data = json.dumps(changes, separators=(",", ":"))
+    return f"id: {last_id}\nevent: seats\ndata: {data}\n\n"
+
+
+class SeatFeed:
+    """Tails seat_changes and fans changes out to per-showtime channels."""
+
+    def __init__(self, poll_interval=POLL_INTERVAL, max_streams=MAX_STREAMS):
+        self.poll_interval = poll_interval
+        self.max_streams = max_streams
+        self.streams = 0
+        self.last_id = None
+        self._channels = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self._next_cleanup = time.monotonic() + CHANNEL_IDLE
+
+    def add_listener(self, listener):
+        """Call `listener(showtime_id, {seat_id: state})` for every change polled."""
+        self._listeners.append(listener)
+
+    def start(self):
+        """Start tailing seat_changes in this process, if it isn't already."""
+        with self._lock:
+            if self._thread is None:
+                self._start()
+
+    def _start(self):
+        conn = connect()
+        self.last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM seat_changes;").fetchone()[0]
+        self._thread = threading.Thread(target=self._run, args=(conn,), name="seat-feed", daemon=True)
+        self._thread.start()
+
+    def open_stream(self):
+        """Claim one of `max_streams` slots; False if they're all taken.
+
+        Give it back with close_stream() once the response is closed.
+        """
+        with self._lock:
+            if self.streams >= self.max_streams:
+                return False
+            self.streams += 1
+            return True
+
+    def close_stream(self):
+        with self._lock:
+            self.streams -= 1
+
+    def _join(self, showtime_id):
+        with self._lock:
+            if self._thread is None:
+                self._start()
+            channel = self._channels.get(showtime_id)
+            if channel is None:
+                channel = self._channels[showtime_id] = Channel(self.last_id)
+            channel.viewers += 1
+            return channel
+
+    def _leave(self, channel):
+        with self._lock:
+            channel.viewers -= 1
+            if not channel.viewers:
+                channel.idle_since = time.monotonic()
+
+    def _drop_idle(self, now):
+        with self._lock:
+            idle = [
+                showtime_id
+                for showtime_id, channel in self._channels.items()
+                if not channel.viewers and now - channel.idle_since > CHANNEL_IDLE
+            ]
+            for showtime_id in idle:
+                del self._channels[showtime_id]
+        return len(idle)
+
+    def poll(self, conn):
+        """Publish everything logged since the last poll. Returns how many changes."""
+        now = time.monotonic()
+        if now >= self._next_cleanup:
+            self._next_cleanup = now + CHANNEL_IDLE
+            self._drop_idle(now)
+
+        rows = conn.execute(
+            "SELECT id, showtime_id, seat_id, state FROM seat_changes WHERE id > ? ORDER BY id LIMIT ?;",
+            (self.last_id, POLL_BATCH),
+        ).fetchall()
+        if not rows:
+            return 0
+
+        diffs = {}  # showtime_id -> {seat_id: latest state}
+        for _, showtime_id, seat_id, state in rows:
+            diffs.setdefault(showtime_id, {})[seat_id] = state
+        last_id = rows[-1][0]
+
+        with self._lock:
+            channels = {showtime_id: self._channels.get(showtime_id) for showtime_id in diffs}
+            self.last_id = last_id
+        for showtime_id, seats in diffs.items():
+            for listener in self._listeners:
+                listener(showtime_id, seats)
+            channel = channels[showtime_id]
+            if channel is None:
+                continue  # nobody is watching this showtime
+            changes = {}
+            for seat_id, state in seats.items():
+                changes.setdefault(state, []).append(seat_id)
+            channel.publish(last_id, encode(last_id, changes))
+        return len(rows)
+
+    def _run(self, conn):
+        while True:
+            try:
+                if self.poll(conn) == POLL_BATCH:
+                    continue  # behind; catch up before sleeping
+            except Exception as exc:  # keep the feed alive; try again next tick
+                print(f"seat feed poll failed: {exc}", file=sys.stderr)
+            time.sleep(self.poll_interval)
+
+    def stream(self, showtime_id, last_event_id=None):
+        """Generator of SSE text for one viewer; runs until the client goes away."""
+        channel = self._join(showtime_id)
+        try:
+            cursor = channel.last_id if last_event_id is None else last_event_id
+            yield f"retry: 2000\nid: {cursor}\n\n"
+            while True:
+                with channel.condition:
+                    if channel.last_id <= cursor:
+                        channel.condition.wait(HEARTBEAT)
+                    messages, gap = channel.since(cursor)
+                    cursor = max(cursor, channel.last_id)
+                if gap:
+                    yield f"id: {cursor}\nevent: reload\ndata: {{}}\n\n"
+                elif messages:
+                    yield "".join(messages)
+                else:
+                    yield ": keep-alive\n\n"
+        finally:
+            self._leave(channel)
+
+    def stats(self):
+        with self._lock:
+            return {"channels": len(self._channels), "streams": self.streams, "last_id": self.last_id}
+
+
+seat_feed = SeatFeed()
@@ -0,0 +1,106 @@
+"""Production server: gunicorn, configured by gunicorn.conf.py.
+
+    gunicorn app:app                                # from this directory
+    python serve.py --workers 4 --threads 16 --port 8000
+
+serve.py only turns its flags into gunicorn's and execs it; everything else
+lives in gunicorn.conf.py and the two hooks below it calls.
+
+The master process imports the app, brings the schema up to date and
+compiles every template once (preload), then forks. Workers inherit all of
+that copy-on-write instead of redoing it. Each worker then opens its own
+SQLite connections (a connection must never cross a fork) and warms up with
+a few internal requests (warm_up), so the pool, statement caches, seat maps
+and rendered pages are ready before it takes its first real request.
+
+One more process, `python jobs.py`, runs the background jobs (booking
+rollups, the hold sweeper, the replica refresher), so there is exactly one
+of each however many workers run; the workers follow the replica it writes.
+
+Only the standard library is imported up front; gunicorn.conf.py imports
+this module before the app is loaded.
+"""
+import argparse
+import os
+import sys
+
+WORKERS = int(os.environ.get("MOVIE_BOOKING_WORKERS", str(os.cpu_count() or 1)))
+THREADS = int(os.environ.get("MOVIE_BOOKING_THREADS", "16"))
+RUN_JOBS = os.environ.get("MOVIE_BOOKING_JOBS", "1") != "0"
+
+WARMUP_PATHS = ("/", "/showtimes", "/analytics")
+WARMUP_SEAT_MAPS = 20  # upcoming showtimes whose seat pages get loaded
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def preload():
+    """Work every worker would otherwise repeat: done once, before forking."""
+    import database
+    import migrations
+    from app import app
+
+    conn = database.connect()
+    migrations.migrate(conn)
+    conn.close()
+
+    # compiled templates live in the Jinja environment's cache, which the
+    # workers inherit; templates aren't auto-reloaded outside debug mode
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+    return app
+
+
+def warm_up(app, threads):
+    """Open this worker's connections and fill its caches."""
+    import database
+
+    pool = database.get_pool()
+    conns = [pool.acquire() for _ in range(min(threads, pool.size))]
+    for conn in conns:
+        pool.release(conn)
+
+    client = app.test_client()
+    for path in WARMUP_PATHS:
+        client.get(path)
+    conn = database.connect()
+    upcoming = conn.execute(
+        "SELECT id FROM showtimes WHERE start_time >= datetime('now', 'localtime') ORDER BY start_time LIMIT ?;",
+        (WARMUP_SEAT_MAPS,),
+    ).fetchall()
+    conn.close()
+    for (showtime_id,) in upcoming:
+        client.get(f"/showtime/{showtime_id}/seats")
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description="Run the app under gunicorn (see gunicorn.conf.py).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=WORKERS, help="processes serving requests")
+    parser.add_argument("--threads", type=int, default=THREADS, help="request threads per worker")
+    parser.add_argument("--no-jobs", action="store_true", help="don't run the background jobs")
+    parser.add_argument("--access-log", action="store_true", help="log every request to stderr")
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    args = _parse_args(argv)
+    # gunicorn.conf.py reads these when gunicorn loads it
+    os.environ["MOVIE_BOOKING_WORKERS"] = str(args.workers)
+    os.environ["MOVIE_BOOKING_THREADS"] = str(args.threads)
+    if args.no_jobs:
+        os.environ["MOVIE_BOOKING_JOBS"] = "0"
+    command = [
+        sys.executable, "-m", "gunicorn",
+        "--config", os.path.join(HERE, "gunicorn.conf.py"),
+        "--chdir", HERE,
+        "--bind", f"{args.host}:{args.port}",
+    ]
+    if args.access_log:
+        command += ["--access-logfile", "-"]
+    os.execv(sys.executable, command + ["app:app"])
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,62 @@
+"""Showtime timestamps.
+
+Times are stored as "YYYY-MM-DD HH:MM:SS" strings - the format SQLite's own
+date functions use - so they sort correctly as text and range queries on
+start_time can use an index. Everything user-facing goes through
+`display_showtime`.
+
+Showtimes and bookings are in local time. Seat holds are in UTC (see
+`utc_now`): they only ever measure a few minutes from now, and local clocks
+jump an hour at DST changes.
+"""
+from datetime import date, datetime, timedelta, timezone
+
+STORAGE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# what start_time used to look like, e.g. "12-10-2025 7:30pm"
+LEGACY_FORMAT = "%m-%d-%Y %I:%M%p"
+
+
+def to_storage(value):
+    return value.strftime(STORAGE_FORMAT)
+
+
+def from_storage(value):
+    return datetime.strptime(value, STORAGE_FORMAT)
+
+
+def utc_now():
+    """The current UTC time as a naive datetime, what SQLite's datetime('now') gives."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def normalize_start_time(value):
+    """Convert a stored start_time in either format to the storage format."""
+    try:
+        return to_storage(from_storage(value))
+    except ValueError:
+        return to_storage(datetime.strptime(value.strip(), LEGACY_FORMAT))
+
+
+def display_showtime(value):
+    """Render a stored timestamp the way the site always has: 12-10-2025 7:30pm."""
+    if not value:
+        return ""
+    dt = from_storage(value)
+    hour = dt.hour % 12 or 12
+    suffix = "am" if dt.hour < 12 else "pm"
+    return f"{dt:%m-%d-%Y} {hour}:{dt:%M}{suffix}"
+
+
+def day_bounds(day):
+    """[start, end) storage strings covering the whole calendar day `day`."""
+    start = datetime.combine(day, datetime.min.time())
+    return to_storage(start), to_storage(start + timedelta(days=1))
+
+
+def parse_day(value):
+    """Parse a YYYY-MM-DD query argument, or return None if it isn't one."""
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None